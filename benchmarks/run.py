@@ -0,0 +1,282 @@
+"""
+Offline benchmark of the processor against local stand-ins for feeds, Supabase and Mistral.
+
+Runs the real fetch, translation and enrichment code through main.process_feeds
+and reports throughput, per-stage latency percentiles and API call counts.
+
+    python benchmarks/run.py --feeds 50 --llm-latency 0.3 --output results.json
+    python benchmarks/run.py --baseline results.json --tolerance 0.15
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeMistral, FakeSupabase, FakeTranslator, FeedServer
+from metrics import RATE_LIMIT_WAIT, STAGE_SECONDS
+from rss_fetcher import RSSFetcher
+from rss_translator import RSSTranslator
+from rss_summarizer import RSSSummarizer
+from write_buffer import WriteBuffer
+from deduplicator import Deduplicator
+from storage import SQLiteClient
+from sharding import ShardCoordinator
+import main as app
+
+class SampleRecorder:
+    def __init__(self):
+        """Keeps every observation of the wrapped histograms for exact percentiles"""
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, histogram, name_label: str = None, fixed_name: str = None) -> None:
+        observe = histogram.observe
+
+        def recording_observe(value, **labels):
+            name = fixed_name or labels.get(name_label, "unknown")
+            if labels.get("operation"):
+                name = f"{name}.{labels['operation']}"
+            self.samples[name].append(value)
+            observe(value, **labels)
+
+        histogram.observe = recording_observe
+
+def percentile(values: List[float], share: float) -> float:
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(share * len(ordered) + 0.5)) - 1))]
+
+def build_config(args: argparse.Namespace, workdir: str) -> dict:
+    with open(os.path.join(SRC, "config.yaml"), 'r') as file:
+        config = yaml.safe_load(file)
+    config['pipeline']['streaming'] = args.mode == "streaming"
+    config['dedup']['enabled'] = not args.no_dedup
+    config['summarization']['mode'] = args.enrich_mode
+    config['summarization']['requests_per_second'] = args.llm_rps
+    config['translation']['cache'].update(
+        enabled=not args.no_cache,
+        path=os.path.join(workdir, "translations.sqlite3")
+    )
+    config['summarization']['cache'].update(
+        enabled=not args.no_llm_cache,
+        backend="disk",
+        path=os.path.join(workdir, "llm.sqlite3")
+    )
+    config['summarization']['classifier'].update(
+        enabled=not args.no_classifier,
+        path=os.path.join(workdir, "category_model.npz"),
+        # Train several times per round instead of every ten minutes
+        update_interval_seconds=2
+    )
+    config['metrics']['snapshot_file'] = os.path.join(workdir, "metrics.json")
+    config['database']['retry_delay_seconds'] = 0.1
+    return config
+
+def completed_entries(rows: List[dict]) -> int:
+    """Entries that went through every stage, directly or as a linked duplicate"""
+    return sum(
+        1 for row in rows
+        if row.get("translated_at") and row.get("ai_title_generated_at") and row.get("category_generated_at")
+    )
+
+def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    logger = logging.getLogger("RSSBenchmark")
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+    recorder = SampleRecorder()
+    recorder.wrap(STAGE_SECONDS, name_label="stage")
+    recorder.wrap(RATE_LIMIT_WAIT, fixed_name="rate_limiter_wait")
+
+    server = FeedServer(
+        feeds=args.feeds,
+        entries=args.entries,
+        latency=args.feed_latency,
+        new_per_round=args.new_per_round,
+        active_share=args.active_share,
+        english_share=args.english_share,
+        duplicate_share=args.duplicate_share,
+        topic_focus=args.topic_focus,
+        seed=args.seed
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="rss-benchmark-")
+    if args.storage == "sqlite":
+        supabase = SQLiteClient(os.path.join(workdir, "rss.sqlite3"))
+    else:
+        supabase = FakeSupabase(latency=args.db_latency)
+    backend = FakeTranslator(latency=args.translate_latency, error_rate=args.translate_error_rate)
+    config = build_config(args, workdir)
+    mistral = FakeMistral(
+        latency=args.llm_latency,
+        rate_limit_share=args.rate_limit_share,
+        retry_after=args.retry_after,
+        categories=config['summarization']['categories']
+    )
+
+    workers = []
+    for index in range(args.workers):
+        write_buffer = WriteBuffer.from_config(supabase, logger, config)
+        fetcher = RSSFetcher(supabase, logger, config, write_buffer)
+        translator = RSSTranslator(supabase, logger, config, write_buffer)
+        translator.translator = backend
+        summarizer = RSSSummarizer(supabase, "benchmark", logger, config, write_buffer)
+        summarizer.mistral = mistral
+        deduplicator = Deduplicator(supabase, logger, config, write_buffer) if config['dedup']['enabled'] else None
+        shard = ShardCoordinator.static(index, args.workers, logger)
+        translator.queue.shard = summarizer.queue.shard = shard
+        if deduplicator and args.workers > 1:
+            deduplicator.shared = True
+        workers.append((shard.assigned(server.urls), fetcher, translator, summarizer, write_buffer, deduplicator))
+
+    def process(worker) -> dict:
+        urls, fetcher, translator, summarizer, write_buffer, deduplicator = worker
+        return app.process_feeds(urls, config, fetcher, translator, summarizer, write_buffer, logger, deduplicator)
+
+    rounds = []
+    started = time.perf_counter()
+    try:
+        for number in range(args.rounds):
+            if number:
+                server.advance()
+            round_started = time.perf_counter()
+            # Shards run side by side like separate worker processes sharing the database
+            counts = {}
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                for worker_counts in executor.map(process, workers):
+                    counts.update(worker_counts)
+            rounds.append({
+                "seconds": time.perf_counter() - round_started,
+                "new_entries": sum(count for count in counts.values() if count),
+                "failed_feeds": sum(1 for count in counts.values() if count is None)
+            })
+    finally:
+        for worker in workers:
+            worker[1].close()
+        server.stop()
+    elapsed = time.perf_counter() - started
+
+    database_calls = {
+        f"{table}.{operation}": count for (table, operation), count in sorted(getattr(supabase, "calls", {}).items())
+    }
+    rows = supabase.table("rss_feeds").select("*").execute().data
+    completed = completed_entries(rows)
+    return {
+        "parameters": vars(args),
+        "seconds": elapsed,
+        "entries": len(rows),
+        "completed_entries": completed,
+        "entries_per_second": completed / elapsed if elapsed else 0.0,
+        "rounds": rounds,
+        "latency": {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+                "total": sum(values)
+            }
+            for name, values in sorted(recorder.samples.items()) if values
+        },
+        "calls": {
+            "feed_requests": dict(server.requests),
+            "database": database_calls,
+            "translator": dict(backend.calls),
+            "mistral": dict(mistral.calls)
+        }
+    }
+
+def print_report(result: dict) -> None:
+    print(f"Processed {result['completed_entries']}/{result['entries']} entries in {result['seconds']:.2f}s "
+          f"({result['entries_per_second']:.1f} entries/s)")
+    for number, round_result in enumerate(result["rounds"], 1):
+        print(f"  round {number}: {round_result['new_entries']} new entries in {round_result['seconds']:.2f}s, "
+              f"{round_result['failed_feeds']} failed feeds")
+    print(f"\n{'stage':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    for name, stats in result["latency"].items():
+        print(f"{name:<24}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}"
+              f"{stats['p99'] * 1000:>10.1f}{stats['total']:>10.2f}")
+    print("\ncalls")
+    for group, calls in result["calls"].items():
+        print(f"  {group}: " + ", ".join(f"{name}={count}" for name, count in calls.items()))
+
+def check_regressions(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Differences from the baseline that exceed the tolerance"""
+    problems = []
+    if result["entries_per_second"] < baseline["entries_per_second"] * (1 - tolerance):
+        problems.append(
+            f"throughput {result['entries_per_second']:.1f} entries/s, baseline {baseline['entries_per_second']:.1f}"
+        )
+    for group in ("translator", "mistral"):
+        current = result["calls"][group].get("requests", 0)
+        previous = baseline["calls"][group].get("requests", 0)
+        if current > previous * (1 + tolerance):
+            problems.append(f"{group} requests {current}, baseline {previous}")
+    current = sum(result["calls"]["database"].values())
+    previous = sum(baseline["calls"]["database"].values())
+    if current > previous * (1 + tolerance):
+        problems.append(f"database requests {current}, baseline {previous}")
+    return problems
+
+def main() -> int:
+    arguments = argparse.ArgumentParser(description="Benchmark the processor against local stand-ins")
+    arguments.add_argument("--feeds", type=int, default=20, help="Number of feeds served")
+    arguments.add_argument("--entries", type=int, default=20, help="Entries per feed document")
+    arguments.add_argument("--rounds", type=int, default=3, help="Processing runs, feeds publish new entries between runs")
+    arguments.add_argument("--new-per-round", type=int, default=2, help="Entries each feed publishes per round")
+    arguments.add_argument("--active-share", type=float, default=0.5, help="Share of feeds publishing per round")
+    arguments.add_argument("--english-share", type=float, default=0.3, help="Share of entries already in English")
+    arguments.add_argument("--duplicate-share", type=float, default=0.1, help="Share of entries repeated across feeds")
+    arguments.add_argument("--feed-latency", type=float, default=0.05, help="Seconds per feed response")
+    arguments.add_argument("--db-latency", type=float, default=0.01, help="Seconds per database request")
+    arguments.add_argument("--translate-latency", type=float, default=0.05, help="Seconds per translation request")
+    arguments.add_argument("--translate-error-rate", type=float, default=0.0, help="Share of failing translation requests")
+    arguments.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per Mistral request")
+    arguments.add_argument("--llm-rps", type=float, default=20.0, help="Configured Mistral requests per second")
+    arguments.add_argument("--rate-limit-share", type=float, default=0.0, help="Share of Mistral requests answered with 429")
+    arguments.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with 429 answers")
+    arguments.add_argument("--workers", type=int, default=1, help="Concurrent workers, each processing one shard of the feeds")
+    arguments.add_argument("--storage", choices=("fake", "sqlite"), default="fake",
+                           help="In-memory Supabase stand-in with --db-latency, or a local SQLite database")
+    arguments.add_argument("--mode", choices=("streaming", "phased"), default="streaming", help="Pipeline mode")
+    arguments.add_argument("--enrich-mode", choices=("batched", "combined", "separate"), default="batched",
+                           help="Summarization mode")
+    arguments.add_argument("--no-cache", action="store_true", help="Disable the translation cache")
+    arguments.add_argument("--no-llm-cache", action="store_true", help="Disable the LLM response cache")
+    arguments.add_argument("--no-classifier", action="store_true", help="Disable the local category classifier")
+    arguments.add_argument("--topic-focus", type=float, default=0.8, help="Share of a feed's entries about its own topic")
+    arguments.add_argument("--no-dedup", action="store_true", help="Disable near-duplicate linking")
+    arguments.add_argument("--seed", type=int, default=0, help="Seed of the generated content and failures")
+    arguments.add_argument("--output", help="Write the results as JSON to this file")
+    arguments.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    arguments.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    arguments.add_argument("--verbose", action="store_true", help="Show the processor's log output")
+    args = arguments.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            problems = check_regressions(result, json.load(file), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+from typing import Optional
+import base64
+import hashlib
+
+class BloomFilter:
+    def __init__(self, bits: int = 8192, hashes: int = 10, data: Optional[bytes] = None, count: int = 0):
+        """
+        Compact set of strings with no false negatives and rare false positives.
+
+        Args:
+            bits: Size of the filter in bits, rounded up to whole bytes
+            hashes: Number of bit positions set per item
+            data: Serialized filter bytes to restore
+            count: Number of items already in the restored filter
+        """
+        self.bits = (bits + 7) // 8 * 8
+        self.hashes = hashes
+        self.data = bytearray(data) if data and len(data) * 8 == self.bits else bytearray(self.bits // 8)
+        self.count = count if data and len(data) * 8 == self.bits else 0
+
+    @property
+    def capacity(self) -> int:
+        """Items the filter holds before its false positive rate exceeds about 0.1%"""
+        return int(self.bits / 14.4)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + i * second) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        """Add an item, starting over once the filter is full so the error rate stays bounded"""
+        if self.count >= self.capacity:
+            self.data = bytearray(self.bits // 8)
+            self.count = 0
+        for position in self._positions(item):
+            self.data[position // 8] |= 1 << position % 8
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.data[position // 8] >> position % 8 & 1 for position in self._positions(item))
+
+    def encode(self) -> str:
+        """Serialize as '<count>:<base64 bits>'"""
+        return f"{self.count}:{base64.b64encode(bytes(self.data)).decode('ascii')}"
+
+    @classmethod
+    def decode(cls, value: Optional[str], bits: int = 8192, hashes: int = 10) -> "BloomFilter":
+        """Restore a filter from encode() output, an empty filter if value is missing or invalid"""
+        try:
+            count, data = value.split(":", 1)
+            return cls(bits, hashes, base64.b64decode(data), int(count))
+        except Exception:
+            return cls(bits, hashes)
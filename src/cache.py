@@ -0,0 +1,217 @@
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from metrics import CACHE_REQUESTS
+
+def fingerprint(*parts: str) -> str:
+    """Stable hash of the given strings, used as a cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class PersistentCache:
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100000,
+        memory_entries: int = 5000,
+        name: str = "cache",
+        ttl_seconds: Optional[float] = None
+    ):
+        """
+        String key/value cache with an in-memory LRU in front of a SQLite file.
+
+        Args:
+            path: SQLite file, created with its directory if missing
+            max_entries: Number of entries kept on disk, least recently used ones are evicted
+            memory_entries: Number of entries kept in the in-memory LRU
+            name: Label of the cache in metrics
+            ttl_seconds: Age after which an entry counts as missing, entries never expire if omitted
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # key -> (value, creation time)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL, created REAL NOT NULL DEFAULT 0)"
+        )
+        # Files written before entries expired lack the creation time, their entries count as old
+        if "created" not in {row[1] for row in self._db.execute("PRAGMA table_info(cache)")}:
+            self._db.execute("ALTER TABLE cache ADD COLUMN created REAL NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_last_used_idx ON cache (last_used)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value or None, counting hits and misses"""
+        with self._lock:
+            if key in self._memory:
+                value, created = self._memory[key]
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    CACHE_REQUESTS.inc(cache=self.name, result="memory_hit")
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1]):
+                if row is not None:
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache=self.name, result="miss")
+                return None
+
+            self._db.execute("UPDATE cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache=self.name, result="disk_hit")
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a value in memory and on disk, evicting old entries when full"""
+        with self._lock:
+            now = time.time()
+            self._remember(key, value, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, last_used, created) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                # Evict a tenth at once so eviction does not run on every insert
+                excess = count - self.max_entries + self.max_entries // 10
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+            self._db.commit()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class RedisCache:
+    def __init__(self, url: str, name: str = "cache", ttl_seconds: Optional[float] = None):
+        """
+        String key/value cache in Redis, shared by every worker using the same server.
+
+        Entries expire after ttl_seconds. Size-based eviction is left to the
+        server's maxmemory policy, allkeys-lru evicts least recently used keys.
+        Connection errors count as misses so a Redis outage only costs requests.
+
+        Args:
+            url: Redis URL, for example redis://localhost:6379/0
+            name: Label of the cache in metrics, also prefixes the keys
+            ttl_seconds: Lifetime of an entry, entries never expire if omitted
+        """
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=5, decode_responses=True)
+        self.name = name
+        self.prefix = f"{name}:"
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_REQUESTS.inc(cache=self.name, result=result)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value or None, counting hits and misses"""
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception:
+            self._count("error")
+            return None
+        self._count("hit" if value is not None else "miss")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a value with the configured lifetime, ignoring connection errors"""
+        try:
+            self.client.set(self.prefix + key, value, ex=int(self.ttl_seconds) if self.ttl_seconds else None)
+        except Exception:
+            CACHE_REQUESTS.inc(cache=self.name, result="error")
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def close(self) -> None:
+        self.client.close()
+
+def open_cache(cache_config: dict, default_path: str, name: str) -> Any:
+    """
+    Create the cache described by a cache config section.
+
+    Args:
+        cache_config: Section with backend (disk or redis), path, url, ttl_seconds, max_entries and memory_entries
+        default_path: SQLite file used when the section has no path
+        name: Label of the cache in metrics
+
+    Returns:
+        A RedisCache when the backend is redis, a PersistentCache otherwise
+    """
+    ttl_seconds = cache_config.get('ttl_seconds')
+    if cache_config.get('backend', 'disk') == 'redis':
+        url = os.environ.get("REDIS_URL") or cache_config.get('url')
+        if not url:
+            raise ValueError(f"REDIS_URL not found in environment variables for the {name} cache")
+        return RedisCache(url, name=name, ttl_seconds=ttl_seconds)
+    return PersistentCache(
+        cache_config.get('path', default_path),
+        max_entries=cache_config.get('max_entries', 100000),
+        memory_entries=cache_config.get('memory_entries', 5000),
+        name=name,
+        ttl_seconds=ttl_seconds
+    )
@@ -0,0 +1,331 @@
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from dateutil import parser
+import copy
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import zlib
+import numpy as np
+from work_queue import timestamp
+from metrics import ITEMS, STAGE_SECONDS
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Columns read to train on stored categories
+TRAINING_COLUMNS = (
+    "id", "source_url", "title", "description", "title_en", "description_en", "category", "category_generated_at"
+)
+
+def article_text(entry: Dict[str, Any]) -> str:
+    """Text classified for an entry, its English version once translated"""
+    title = entry.get("title_en") or entry.get("title") or ""
+    description = entry.get("description_en") or entry.get("description") or ""
+    return f"{title} {description}"
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    exponents = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exponents / exponents.sum(axis=1, keepdims=True)
+
+class CategoryClassifier:
+    def __init__(self, supabase: "Client", logger: logging.Logger, config: dict):
+        """
+        Local category classifier answering the obvious cases before the LLM is asked.
+
+        A softmax regression over hashed word unigram and bigram TF-IDF
+        features is combined with a per-source prior, so sources that
+        publish almost only one category are recognized from few entries.
+        The model trains incrementally on categories generated by the LLM
+        since its last update and is saved to disk between runs. Only
+        predictions above the confidence threshold are used.
+
+        Args:
+            supabase: Supabase client instance
+            logger: Logger instance
+            config: Configuration dictionary, summarization categories and classifier sections are used
+        """
+        self.supabase = supabase
+        self.logger = logger
+        self.categories = list(config['summarization']['categories'])
+        self.config = config['summarization'].get('classifier', {})
+        self.path = self.config.get('path', 'cache/category_model.npz')
+        self.dimensions = 2 ** self.config.get('hash_bits', 16)
+        self.threshold = self.config.get('confidence_threshold', 0.9)
+        self.min_training_rows = self.config.get('min_training_rows', 200)
+        self.prior_strength = self.config.get('prior_strength', 5.0)
+        self.learning_rate = self.config.get('learning_rate', 10.0)
+        self.epochs = self.config.get('epochs', 5)
+        self.batch_size = self.config.get('batch_size', 64)
+        self.page_size = self.config.get('page_size', 1000)
+        self.max_rows_per_update = self.config.get('max_rows_per_update', 20000)
+        self.update_interval = self.config.get('update_interval_seconds', 600)
+        self._index = {category: position for position, category in enumerate(self.categories)}
+        # Guards swapping in a retrained model, the update lock lets one thread train at a time
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._updated_at: Optional[float] = None
+        self._reset()
+        self._load()
+
+    def _reset(self) -> None:
+        classes = len(self.categories)
+        self.weights = np.zeros((self.dimensions, classes))
+        self.bias = np.zeros(classes)
+        self.document_frequency = np.zeros(self.dimensions)
+        self.documents = 0
+        self.class_counts = np.zeros(classes)
+        self.source_counts: Dict[str, np.ndarray] = {}
+        # category_generated_at and id of the last row trained on
+        self.watermark: Optional[Tuple[str, Any]] = None
+
+    def _load(self) -> None:
+        """Load the saved model, unless it was trained for other categories or feature sizes"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as saved:
+                meta = json.loads(str(saved["meta"]))
+                if meta["categories"] != self.categories or saved["weights"].shape[0] != self.dimensions:
+                    self.logger.info("Category model was trained with other settings, retraining")
+                    return
+                self.weights = saved["weights"]
+                self.bias = saved["bias"]
+                self.document_frequency = saved["document_frequency"]
+                self.class_counts = saved["class_counts"]
+                self.source_counts = dict(zip(meta["sources"], saved["source_counts"]))
+                self.documents = meta["documents"]
+                self.watermark = tuple(meta["watermark"]) if meta["watermark"] else None
+            self.logger.info(f"Loaded category model trained on {int(self.class_counts.sum())} entries")
+        except Exception as e:
+            self.logger.warning(f"Error loading category model, retraining: {str(e)}")
+            self._reset()
+
+    def save(self) -> None:
+        """Write the model atomically to its file"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        sources = sorted(self.source_counts)
+        meta = {
+            "categories": self.categories,
+            "sources": sources,
+            "documents": self.documents,
+            "watermark": list(self.watermark) if self.watermark else None
+        }
+        # A unique temporary file, other processes may save the same model at the same time
+        descriptor, temp_file = tempfile.mkstemp(dir=directory or ".", prefix=f"{os.path.basename(self.path)}.")
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                np.savez_compressed(
+                    file,
+                    weights=self.weights,
+                    bias=self.bias,
+                    document_frequency=self.document_frequency,
+                    class_counts=self.class_counts,
+                    source_counts=np.array([self.source_counts[source] for source in sources]).reshape(-1, len(self.categories)),
+                    meta=np.array(json.dumps(meta))
+                )
+            os.replace(temp_file, self.path)
+        except BaseException:
+            os.unlink(temp_file)
+            raise
+
+    def _hash(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Row, hashed feature and count of every distinct word unigram and bigram of the texts"""
+        rows, features, counts = [], [], []
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            grams = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+            hashed = Counter(zlib.crc32(gram.encode("utf-8")) & (self.dimensions - 1) for gram in grams)
+            rows.extend([row] * len(hashed))
+            features.extend(hashed.keys())
+            counts.extend(hashed.values())
+        return np.array(rows, dtype=np.int64), np.array(features, dtype=np.int64), np.array(counts, dtype=float)
+
+    def _tfidf(self, rows: np.ndarray, features: np.ndarray, counts: np.ndarray, size: int) -> np.ndarray:
+        """Sublinear TF-IDF values of hashed features, L2-normalized per row"""
+        idf = np.log((1 + self.documents) / (1 + self.document_frequency[features])) + 1
+        values = (1 + np.log(counts)) * idf
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=size))
+        return values / np.maximum(norms[rows], 1e-12)
+
+    def _logits(self, rows: np.ndarray, features: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+        logits = np.tile(self.bias, (size, 1))
+        np.add.at(logits, rows, self.weights[features] * values[:, None])
+        return logits
+
+    def _source_prior(self, sources: List[Optional[str]], class_prior: np.ndarray) -> np.ndarray:
+        """Smoothed category distribution of each source, the overall one for unknown sources"""
+        prior = np.tile(class_prior, (len(sources), 1))
+        for row, source in enumerate(sources):
+            if (counts := self.source_counts.get(source)) is not None:
+                prior[row] = (counts + self.prior_strength * class_prior) / (counts.sum() + self.prior_strength)
+        return prior
+
+    def probabilities(self, entries: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Category probabilities of entries, computed for the whole batch at once.
+
+        The text model already reflects the overall category frequencies, so
+        its probabilities are multiplied by the source prior relative to them.
+
+        Args:
+            entries: Entries with source_url and title and description, in English if translated
+
+        Returns:
+            Array of one row per entry and one column per category
+        """
+        rows, features, counts = self._hash([article_text(entry) for entry in entries])
+        values = self._tfidf(rows, features, counts, len(entries))
+        text = softmax(self._logits(rows, features, values, len(entries)))
+        class_prior = (self.class_counts + 1) / (self.class_counts.sum() + len(self.categories))
+        combined = text * self._source_prior([entry.get("source_url") for entry in entries], class_prior) / class_prior
+        return combined / combined.sum(axis=1, keepdims=True)
+
+    def predict(self, entries: List[Dict[str, Any]]) -> Dict[Any, str]:
+        """
+        Categories of the entries the model is confident about.
+
+        Args:
+            entries: Entries with id, source_url, title and description
+
+        Returns:
+            Category by entry id, entries below the confidence threshold are omitted
+        """
+        if not entries:
+            return {}
+        self.refresh()
+        with self._lock, STAGE_SECONDS.time(stage="classify"):
+            if self.class_counts.sum() < self.min_training_rows:
+                return {}
+            probabilities = self.probabilities(entries)
+        best = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(entries)), best]
+        predictions = {
+            entry["id"]: self.categories[best[row]]
+            for row, entry in enumerate(entries) if confidence[row] >= self.threshold
+        }
+        ITEMS.inc(len(predictions), stage="classify", result="local")
+        ITEMS.inc(len(entries) - len(predictions), stage="classify", result="uncertain")
+        return predictions
+
+    def partial_fit(self, entries: List[Dict[str, Any]]) -> int:
+        """
+        Update the model with labelled entries.
+
+        Document frequencies and source counts are updated first, then the
+        weights take a few epochs of mini-batch gradient steps over the new
+        entries only.
+
+        Args:
+            entries: Entries with source_url, title, description and category
+
+        Returns:
+            Number of entries trained on, entries with unknown categories are skipped
+        """
+        entries = [entry for entry in entries if entry.get("category") in self._index]
+        if not entries:
+            return 0
+        entries = random.Random(len(entries)).sample(entries, len(entries))
+        labels = np.array([self._index[entry["category"]] for entry in entries])
+        for entry, label in zip(entries, labels):
+            if entry.get("source_url"):
+                self.source_counts.setdefault(entry["source_url"], np.zeros(len(self.categories)))[label] += 1
+        self.class_counts += np.bincount(labels, minlength=len(self.categories))
+
+        rows, features, counts = self._hash([article_text(entry) for entry in entries])
+        np.add.at(self.document_frequency, features, 1)
+        self.documents += len(entries)
+        values = self._tfidf(rows, features, counts, len(entries))
+        # Entries are contiguous in rows, so a mini-batch of entries is a slice of the features
+        offsets = np.searchsorted(rows, np.arange(len(entries) + 1))
+        for _ in range(self.epochs):
+            for start in range(0, len(entries), self.batch_size):
+                end = min(start + self.batch_size, len(entries))
+                batch = slice(offsets[start], offsets[end])
+                batch_rows, batch_features, batch_values = rows[batch] - start, features[batch], values[batch]
+                gradient = softmax(self._logits(batch_rows, batch_features, batch_values, end - start))
+                gradient[np.arange(end - start), labels[start:end]] -= 1
+                gradient /= end - start
+                np.add.at(self.weights, batch_features, -self.learning_rate * batch_values[:, None] * gradient[batch_rows])
+                self.bias -= self.learning_rate * gradient.sum(axis=0)
+        return len(entries)
+
+    def _labelled_since(
+        self, watermark: Optional[Tuple[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, Any]]]:
+        """Entries categorized by the LLM after the watermark, oldest first, and the watermark after them"""
+        entries: List[Dict[str, Any]] = []
+        while len(entries) < self.max_rows_per_update:
+            query = self.supabase.table("rss_feeds")\
+                .select(*TRAINING_COLUMNS)\
+                .eq("category_source", "llm")
+            if watermark:
+                generated_at, last_id = watermark
+                query = query.or_(
+                    f"category_generated_at.gt.{generated_at},"
+                    f"and(category_generated_at.eq.{generated_at},id.gt.{last_id})"
+                )
+            page = query.order("category_generated_at").order("id").limit(self.page_size).execute().data
+            if not page:
+                break
+            entries.extend(page)
+            last = page[-1]
+            watermark = (timestamp(parser.parse(last["category_generated_at"])), last["id"])
+            if len(page) < self.page_size:
+                break
+        return entries, watermark
+
+    def _copy(self) -> "CategoryClassifier":
+        """Copy of the model whose arrays can be trained without affecting predictions"""
+        model = copy.copy(self)
+        model.weights = self.weights.copy()
+        model.bias = self.bias.copy()
+        model.document_frequency = self.document_frequency.copy()
+        model.class_counts = self.class_counts.copy()
+        model.source_counts = {source: counts.copy() for source, counts in self.source_counts.items()}
+        return model
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Train on categories stored since the last update, at most every update_interval_seconds.
+
+        Rows are read and a copy of the model is trained without holding the
+        model lock, so predictions of other threads continue on the current
+        model, which is swapped for the trained one at the end. The watermark
+        only moves once the copy is trained, so failed updates are retried.
+        """
+        if not self._update_lock.acquire(blocking=False):
+            # Another thread is already updating the model
+            return
+        try:
+            if not force and self._updated_at and time.time() - self._updated_at < self.update_interval:
+                return
+            self._updated_at = time.time()
+            entries, watermark = self._labelled_since(self.watermark)
+            if not entries:
+                return
+            model = self._copy()
+            trained = model.partial_fit(entries)
+            with self._lock:
+                self.weights, self.bias = model.weights, model.bias
+                self.document_frequency, self.documents = model.document_frequency, model.documents
+                self.class_counts, self.source_counts = model.class_counts, model.source_counts
+                self.watermark = watermark
+            if trained:
+                self.save()
+                self.logger.info(
+                    f"Category model trained on {trained} new entries, {int(self.class_counts.sum())} in total"
+                )
+        except Exception as e:
+            self.logger.warning(f"Error updating category model: {str(e)}")
+        finally:
+            self._update_lock.release()
@@ -0,0 +1,332 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from dateutil import parser
+import hashlib
+import logging
+import re
+import threading
+import pytz
+import unicodedata
+from write_buffer import WriteBuffer
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Fields copied from a canonical entry to its duplicates, grouped by the timestamp that marks them done
+COPIED_FIELDS = {
+    "translated_at": ("title_en", "description_en"),
+    "ai_title_generated_at": ("ai_title",),
+    "category_generated_at": ("category",),
+    "summarized_at": ("summary",)
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def simhash(text: str, shingle_size: int = 3) -> Optional[int]:
+    """64-bit SimHash of the word shingles of text, None if text has no words"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    words = WORD_PATTERN.findall("".join(char for char in text if not unicodedata.combining(char)))
+    if not words:
+        return None
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+class Deduplicator:
+    def __init__(
+        self,
+        supabase: "Client",
+        logger: logging.Logger,
+        config: Optional[dict] = None,
+        write_buffer: Optional[WriteBuffer] = None
+    ):
+        """
+        Link near-duplicate entries to a canonical entry and reuse its processing.
+
+        Entries are fingerprinted with SimHash over normalized title and
+        description. An LSH index with four 16-bit bands finds earlier
+        entries within max_distance bits inside a rolling time window.
+        Duplicates are excluded from translation and enrichment, and get
+        the canonical entry's results copied instead.
+
+        Args:
+            supabase: Supabase client instance
+            logger: Logger instance
+            config: Configuration dictionary, the dedup section is used
+            write_buffer: Shared buffer for rss_feeds writes, a private one is created if omitted
+        """
+        self.supabase = supabase
+        self.logger = logger
+        self.config = (config or {}).get('dedup', {})
+        # Separate mode never generates summaries, so duplicates are complete without one
+        mode = (config or {}).get('summarization', {}).get('mode', 'combined')
+        self.expected_fields = [
+            timestamp for timestamp in COPIED_FIELDS if timestamp != "summarized_at" or mode in ("combined", "batched")
+        ]
+        self.write_buffer = write_buffer or WriteBuffer(supabase, logger)
+        self.window = timedelta(hours=self.config.get('window_hours', 48))
+        self.max_distance = min(3, self.config.get('max_distance', 3))
+        self.shingle_size = self.config.get('shingle_size', 3)
+        self.min_words = self.config.get('min_words', 6)
+        self.bands: List[Dict[int, List[Any]]] = [{} for _ in range(4)]
+        self.fingerprints: Dict[Any, tuple] = {}
+        self.duplicates_found = 0
+        self.window_loaded = False
+        # Highest id indexed from the database, rows stored after it are loaded incrementally
+        self.last_loaded_id: Optional[Any] = None
+        # Set when other workers store entries too, their new rows are then indexed before each link
+        self.shared = False
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, entry: Dict[str, Any]) -> Optional[int]:
+        text = f"{entry.get('title') or ''} {entry.get('description') or ''}"
+        if len(WORD_PATTERN.findall(text)) < self.min_words:
+            return None
+        return simhash(text, self.shingle_size)
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        return [fingerprint >> (16 * band) & 0xFFFF for band in range(4)]
+
+    def _timestamp(self, value: Optional[str]) -> datetime:
+        try:
+            moment = parser.parse(value)
+            return moment if moment.tzinfo else pytz.UTC.localize(moment)
+        except Exception:
+            return datetime.now(pytz.UTC)
+
+    def _pub_date(self, entry: Dict[str, Any]) -> datetime:
+        return self._timestamp(entry.get("pub_date"))
+
+    def _add(self, entry_id: Any, fingerprint: int, pub_date: datetime) -> None:
+        self.fingerprints[entry_id] = (fingerprint, pub_date)
+        for band, key in zip(self.bands, self._band_keys(fingerprint)):
+            band.setdefault(key, []).append(entry_id)
+
+    def _find(self, fingerprint: int, pub_date: datetime) -> Optional[Any]:
+        """Earliest indexed entry within max_distance bits and the time window"""
+        best = None
+        for band, key in zip(self.bands, self._band_keys(fingerprint)):
+            for entry_id in band.get(key, []):
+                other, other_date = self.fingerprints[entry_id]
+                if abs(pub_date - other_date) > self.window:
+                    continue
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    if best is None or other_date < self.fingerprints[best][1]:
+                        best = entry_id
+        return best
+
+    def _prune(self) -> None:
+        """Drop fingerprints older than the window"""
+        cutoff = datetime.now(pytz.UTC) - self.window
+        expired = {entry_id for entry_id, (_, pub_date) in self.fingerprints.items() if pub_date < cutoff}
+        if not expired:
+            return
+        for entry_id in expired:
+            del self.fingerprints[entry_id]
+        for band in self.bands:
+            for key in list(band):
+                band[key] = [entry_id for entry_id in band[key] if entry_id not in expired]
+                if not band[key]:
+                    del band[key]
+
+    def _index_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Add stored canonical rows to the index, caller holds the lock"""
+        for entry in rows:
+            if entry["id"] not in self.fingerprints and (fingerprint := self._fingerprint(entry)) is not None:
+                self._add(entry["id"], fingerprint, self._pub_date(entry))
+        if rows:
+            newest = max(entry["id"] for entry in rows)
+            self.last_loaded_id = newest if self.last_loaded_id is None else max(self.last_loaded_id, newest)
+
+    def load_window(self, page_size: int = 1000) -> None:
+        """Index the newest canonical entries published inside the window, up to max_window_entries"""
+        since = (datetime.now(pytz.UTC) - self.window).isoformat()
+        max_entries = self.config.get('max_window_entries', 10000)
+        rows = []
+        # PostgREST caps every response at its max-rows setting, so the window is read in pages
+        # until one comes back empty, which also works when max-rows is below page_size
+        while len(rows) < max_entries:
+            start = len(rows)
+            try:
+                result = self.supabase.table("rss_feeds")\
+                    .select("id", "title", "description", "pub_date")\
+                    .gte("pub_date", since)\
+                    .is_("canonical_id", "null")\
+                    .order("pub_date", desc=True)\
+                    .order("id", desc=True)\
+                    .range(start, min(start + page_size, max_entries) - 1)\
+                    .execute()
+            except Exception as e:
+                self.logger.error(f"Error loading dedup window: {str(e)}")
+                return
+            if not result.data:
+                break
+            rows.extend(result.data)
+        with self._lock:
+            self._index_rows(rows)
+            self.window_loaded = True
+        self.logger.info(f"Dedup index holds {len(self.fingerprints)} entries")
+
+    def load_new(self, page_size: int = 1000) -> None:
+        """Index canonical entries stored after the last loaded one, by this or other workers"""
+        since = (datetime.now(pytz.UTC) - self.window).isoformat()
+        while True:
+            try:
+                query = self.supabase.table("rss_feeds")\
+                    .select("id", "title", "description", "pub_date")\
+                    .gte("pub_date", since)\
+                    .is_("canonical_id", "null")
+                if self.last_loaded_id is not None:
+                    query = query.gt("id", self.last_loaded_id)
+                result = query.order("id").limit(page_size).execute()
+            except Exception as e:
+                self.logger.warning(f"Error loading new entries into the dedup index: {str(e)}")
+                return
+            with self._lock:
+                self._index_rows(result.data)
+            if len(result.data) < page_size:
+                return
+
+    def _copied_fields(self, canonical: Dict[str, Any], entry: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Results of a canonical entry that are ready to be reused and still missing on entry"""
+        fields = {}
+        for timestamp, columns in COPIED_FIELDS.items():
+            if canonical.get(timestamp) is not None and (entry or {}).get(timestamp) is None:
+                fields[timestamp] = canonical[timestamp]
+                fields.update({column: canonical.get(column) for column in columns})
+        return fields
+
+    def _load_canonicals(self, ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        columns = ["id", "translate_dead_at", "enrich_dead_at"]
+        for timestamp, fields in COPIED_FIELDS.items():
+            columns.append(timestamp)
+            columns.extend(fields)
+        result = self.supabase.table("rss_feeds")\
+            .select(*columns)\
+            .in_("id", list(set(ids)))\
+            .execute()
+        return {row["id"]: row for row in result.data}
+
+    def link(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Link stored rows to earlier near-duplicates and queue the copied results.
+
+        Args:
+            rows: Stored rows with id, title, description and pub_date
+
+        Returns:
+            The rows that are not duplicates and still need processing
+        """
+        if not rows:
+            return []
+        if not self.window_loaded:
+            self.load_window()
+        elif self.shared:
+            # Copies of a story may have been stored by the worker owning another feed
+            self.load_new()
+
+        now = datetime.now(pytz.UTC).isoformat()
+        canonical_rows = []
+        links = {}
+        with self._lock:
+            self._prune()
+            for row in rows:
+                fingerprint = self._fingerprint(row)
+                pub_date = self._pub_date(row)
+                canonical_id = self._find(fingerprint, pub_date) if fingerprint is not None else None
+                if canonical_id is not None and canonical_id != row["id"]:
+                    links[row["id"]] = canonical_id
+                    continue
+                if fingerprint is not None and row["id"] not in self.fingerprints:
+                    self._add(row["id"], fingerprint, pub_date)
+                canonical_rows.append(row)
+
+        canonicals = {}
+        if links:
+            try:
+                canonicals = self._load_canonicals(list(links.values()))
+            except Exception as e:
+                self.logger.warning(f"Error loading canonical entries, results will be copied later: {str(e)}")
+
+        for row in rows:
+            update_data = {"dedup_checked_at": now}
+            if row["id"] in links:
+                canonical_id = links[row["id"]]
+                update_data["canonical_id"] = canonical_id
+                update_data.update(self._copied_fields(canonicals.get(canonical_id, {})))
+            self.write_buffer.add_update(row["id"], update_data)
+
+        if links:
+            self.duplicates_found += len(links)
+            self.logger.info(f"Linked {len(links)} near-duplicate entries to canonical entries")
+        return canonical_rows
+
+    def link_pending(self, batch_size: int = 100) -> None:
+        """Check stored entries inside the window that have not been through deduplication yet"""
+        since = (datetime.now(pytz.UTC) - self.window).isoformat()
+        while True:
+            try:
+                result = self.supabase.table("rss_feeds")\
+                    .select("id", "title", "description", "pub_date")\
+                    .is_("dedup_checked_at", "null")\
+                    .gte("pub_date", since)\
+                    .order("id")\
+                    .limit(batch_size)\
+                    .execute()
+            except Exception as e:
+                self.logger.error(f"Error fetching entries to deduplicate: {str(e)}")
+                return
+            if not result.data:
+                return
+            self.link(result.data)
+            if not self.write_buffer.flush():
+                self.logger.error("Failed to save deduplication results, stopping")
+                return
+
+    def propagate(self, batch_size: int = 100) -> None:
+        """
+        Copy results that canonical entries gained since their duplicates were linked.
+
+        Only duplicates that still miss a field the current summarization
+        mode produces are read. A duplicate that is still incomplete one
+        window after it was linked is unlinked and processed by itself, so
+        it cannot wait on its canonical entry forever and completed
+        duplicates are not scanned again on every run.
+        """
+        cutoff = datetime.now(pytz.UTC) - self.window
+        offset_id = None
+        while True:
+            try:
+                query = self.supabase.table("rss_feeds")\
+                    .select("id", "canonical_id", "dedup_checked_at", *COPIED_FIELDS)\
+                    .not_.is_("canonical_id", "null")\
+                    .or_(",".join(f"{timestamp}.is.null" for timestamp in self.expected_fields))
+                if offset_id is not None:
+                    query = query.gt("id", offset_id)
+                result = query.order("id").limit(batch_size).execute()
+                if not result.data:
+                    break
+                canonicals = self._load_canonicals([row["canonical_id"] for row in result.data])
+            except Exception as e:
+                self.logger.error(f"Error propagating duplicate results: {str(e)}")
+                return
+
+            for row in result.data:
+                canonical = canonicals.get(row["canonical_id"])
+                if canonical is None or canonical.get("translate_dead_at") or canonical.get("enrich_dead_at"):
+                    # The canonical entry will never be complete, process the duplicate itself
+                    self.write_buffer.add_update(row["id"], {"canonical_id": None})
+                    continue
+                fields = self._copied_fields(canonical, row)
+                complete = all(row.get(timestamp) or fields.get(timestamp) for timestamp in self.expected_fields)
+                if not complete and self._timestamp(row.get("dedup_checked_at")) < cutoff:
+                    # Linked a whole window ago and the canonical entry is still not done, stop waiting for it
+                    fields["canonical_id"] = None
+                if fields:
+                    self.write_buffer.add_update(row["id"], fields)
+            offset_id = result.data[-1]["id"]
+        self.write_buffer.flush()
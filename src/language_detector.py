@@ -0,0 +1,133 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+import logging
+import re
+import threading
+
+POLISH_CHARACTERS = re.compile(r"[ąćęłńóśźżĄĆĘŁŃÓŚŹŻ]")
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+# Short words that are also Polish ("a", "to", "on", "by", "was") are left out, so ASCII-only
+# Polish titles do not pass as English
+ENGLISH_STOPWORDS = frozenset(
+    "the an of in and or for with at from is are were be been has have had "
+    "it its this that not but will would can could after over about into new says said".split()
+)
+POLISH_FUNCTION_WORDS = frozenset(
+    "nie dla sie jest na w z ze i do od po o za czy co jak oraz tak juz".split()
+)
+
+# langdetect loads its profiles lazily without locking, so the first use is serialized here
+_LANGDETECT_LOCK = threading.Lock()
+
+class LanguageDetector:
+    def __init__(self, logger: logging.Logger, config: Optional[dict] = None):
+        """
+        Cheap language identification with per-source hints and a full detector as fallback.
+
+        Args:
+            logger: Logger instance
+            config: The translation.language_detection configuration section
+        """
+        self.logger = logger
+        config = config or {}
+        self.min_text_length = config.get('min_text_length', 10)
+        self.min_source_samples = config.get('min_source_samples', 20)
+        self.source_confidence = config.get('source_confidence', 0.95)
+        self.stopword_ratio = config.get('stopword_ratio', 0.2)
+        self.min_stopwords = config.get('min_stopwords', 2)
+        self.source_languages: Dict[str, Counter] = defaultdict(Counter)
+        self.stats = Counter()
+        self._detect = None
+
+    def load_source_hints(self, supabase, limit: int = 2000) -> None:
+        """Learn source languages from recently translated entries"""
+        try:
+            result = supabase.table("rss_feeds")\
+                .select("source_url", "title", "title_en")\
+                .not_.is_("translated_at", "null")\
+                .order("translated_at", desc=True)\
+                .limit(limit)\
+                .execute()
+        except Exception as e:
+            self.logger.warning(f"Error loading source language hints: {str(e)}")
+            return
+
+        for row in result.data:
+            if not row.get("title") or len(row["title"].strip()) < self.min_text_length:
+                continue
+            if row.get("title_en") == row["title"]:
+                self.learn(row["source_url"], "en")
+            else:
+                self.learn(row["source_url"], self.guess(row["title"]) or "other")
+        self.logger.info(f"Loaded language hints for {len(self.source_languages)} sources")
+
+    def learn(self, source_url: Optional[str], language: str) -> None:
+        """Record the language of an entry from source_url"""
+        if source_url:
+            self.source_languages[source_url][language] += 1
+
+    def source_language(self, source_url: Optional[str]) -> Optional[str]:
+        """Dominant language of a source, if it is known with enough confidence"""
+        counts = self.source_languages.get(source_url) if source_url else None
+        if not counts:
+            return None
+        total = sum(counts.values())
+        language, count = counts.most_common(1)[0]
+        if total >= self.min_source_samples and count / total >= self.source_confidence:
+            return language
+        return None
+
+    def guess(self, text: str) -> Optional[str]:
+        """Character-set and stopword heuristic, returns None when unsure"""
+        if POLISH_CHARACTERS.search(text):
+            return "pl"
+        words = WORD_PATTERN.findall(text.lower())
+        if not words or not text.isascii():
+            return None
+        if POLISH_FUNCTION_WORDS.intersection(words):
+            return None
+        stopwords = [word for word in words if word in ENGLISH_STOPWORDS]
+        if len(set(stopwords)) >= self.min_stopwords and len(stopwords) / len(words) >= self.stopword_ratio:
+            return "en"
+        return None
+
+    def _full_detect(self, text: str) -> str:
+        if self._detect is None:
+            with _LANGDETECT_LOCK:
+                # Load the profiles up front and seed the factory so results are stable
+                from langdetect import DetectorFactory, detect
+                from langdetect.detector_factory import init_factory
+                DetectorFactory.seed = 0
+                init_factory()
+                self._detect = detect
+        return self._detect(text)
+
+    def detect(self, text: str, source_url: Optional[str] = None) -> Optional[str]:
+        """Language code of text, None for texts too short to tell"""
+        if not text or len(text.strip()) < self.min_text_length:
+            self.stats["short"] += 1
+            return None
+
+        if language := self.source_language(source_url):
+            self.stats["source_hint"] += 1
+            return language
+
+        language = self.guess(text)
+        if language:
+            self.stats["heuristic"] += 1
+        else:
+            try:
+                language = self._full_detect(text)
+                self.stats["full_detection"] += 1
+            except Exception as e:
+                self.logger.warning(f"Language detection error: {str(e)}")
+                self.stats["failed"] += 1
+                return "unknown"
+
+        self.learn(source_url, language)
+        return language
+
+    def detect_batch(self, texts: List[str], source_urls: Optional[List[Optional[str]]] = None) -> List[Optional[str]]:
+        """Detect the language of many texts, sources known to be monolingual skip detection"""
+        source_urls = source_urls or [None] * len(texts)
+        return [self.detect(text, source_url) for text, source_url in zip(texts, source_urls)]
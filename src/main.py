@@ -1,5 +1,9 @@
 import os
-from supabase import create_client
+import argparse
+import signal
+import socket
+import threading
+import time
 from dotenv import load_dotenv
 import yaml
 import logging
@@ -7,6 +11,16 @@ from logging.handlers import RotatingFileHandler
 from rss_fetcher import RSSFetcher
 from rss_translator import RSSTranslator
 from rss_summarizer import RSSSummarizer
+from write_buffer import WriteBuffer
+from pipeline import StreamingPipeline
+from scheduler import FeedScheduler
+from deduplicator import Deduplicator
+from storage import create_storage
+from sharding import ShardCoordinator
+from metrics import BACKLOG, CACHE_HIT_RATIO, LIMITER_RATE, METRICS
+
+# Stages selectable with --stages, in processing order
+STAGES = ("fetch", "translate", "enrich")
 
 def load_config():
     """Load configuration from YAML file"""
@@ -62,7 +76,163 @@ def read_urls(filename: str) -> list:
     with open(filename, 'r') as file:
         return [line.strip() for line in file if line.strip()]
 
+def parse_stages(value: str) -> set:
+    """Parse a comma-separated list of stages"""
+    stages = {stage.strip() for stage in value.split(',') if stage.strip()}
+    unknown = stages - set(STAGES)
+    if unknown or not stages:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated subset of {', '.join(STAGES)}, got {value!r}")
+    return stages
+
+def parse_shard(value: str) -> tuple:
+    """Parse a shard written as INDEX/COUNT"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected INDEX/COUNT, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}, got {value!r}")
+    return index, count
+
+def has_work(stage, name, logger) -> bool:
+    """Check a stage's backlog before running it, so idle stages never load their clients"""
+    if stage is None:
+        return False
+    if not stage.has_backlog():
+        logger.info(f"No {name} backlog, skipping the stage")
+        return False
+    return True
+
+def process_feeds(urls, config, fetcher, translator, summarizer, write_buffer, logger, deduplicator=None) -> dict:
+    """Run the stages for the given feeds, returns new entry counts per URL. Stages passed as None are skipped."""
+    # Streaming connects all three stages, a subset runs phase by phase
+    if config.get('pipeline', {}).get('streaming', False) and fetcher and translator and summarizer:
+        # New entries flow through all stages while fetching continues
+        pipeline = StreamingPipeline(fetcher, translator, summarizer, write_buffer, logger, config, deduplicator)
+        counts = pipeline.run(urls, config['rss']['default_history_days'])
+    else:
+        # Fetch new RSS entries
+        counts = fetcher.fetch_all(urls, config['rss']['default_history_days']) if fetcher else {}
+        
+        # Link near-duplicates so they are not translated and enriched again
+        if deduplicator:
+            deduplicator.link_pending()
+        
+        # Translate pending entries
+        if has_work(translator, "translation", logger):
+            translator.translate_entries(config['translation']['batch_size'])
+        
+        # Summarize translated entries
+        if has_work(summarizer, "enrichment", logger):
+            summarizer.summarize_entries(config['summarization']['batch_size'])
+        
+        # Copy fresh results of canonical entries to their duplicates
+        if deduplicator:
+            deduplicator.propagate()
+    write_buffer.flush()
+    return counts
+
+def record_metrics(config, translator, summarizer, logger, supabase=None, worker_id=None, count_backlog=True):
+    """Sample the gauges that need a query and write the metrics snapshot for the web service"""
+    metrics_config = config.get('metrics', {})
+    if count_backlog and metrics_config.get('backlog', True):
+        count = metrics_config.get('backlog_count', 'planned')
+        for stage, component in (("translate", translator), ("enrich", summarizer)):
+            size = component.backlog_size(count) if component else None
+            if size is not None:
+                BACKLOG.set(size, stage=stage)
+    for cache in (translator and translator.cache, summarizer and summarizer.cache):
+        if cache:
+            CACHE_HIT_RATIO.set(cache.stats()["hit_rate"], cache=cache.name)
+    if summarizer:
+        LIMITER_RATE.set(summarizer.limiter.stats()["rate"])
+    try:
+        METRICS.write_snapshot(metrics_config.get('snapshot_file', 'cache/metrics.json'))
+    except Exception as e:
+        logger.warning(f"Error writing metrics snapshot: {str(e)}")
+    if supabase and worker_id and metrics_config.get('publish', False):
+        # The web service runs on another host and reads the workers' snapshots from the database
+        try:
+            METRICS.publish(
+                supabase,
+                worker_id,
+                metrics_config.get('retention_seconds', 86400),
+                metrics_config.get('table', 'metrics_snapshots')
+            )
+        except Exception as e:
+            logger.warning(f"Error publishing metrics snapshot: {str(e)}")
+
+def run_daemon(
+    config, fetcher, translator, summarizer, write_buffer, logger, deduplicator=None, shard=None, supabase=None, worker_id=None
+):
+    """Keep the clients warm and poll each feed on its own adaptive schedule"""
+    scheduler = FeedScheduler(logger, config)
+    # Workers sharing a disk share the schedule, each saving only its own feeds,
+    # so a restarted worker continues whatever its worker id
+    scheduler.shared = shard is not None
+    scheduler.load()
+    max_sleep = config.get('scheduler', {}).get('max_sleep_seconds', 60)
+    # Backlog counts scan rss_feeds, so they are taken less often than every cycle
+    backlog_interval = config.get('metrics', {}).get('backlog_interval_seconds', 300)
+    backlog_counted_at = 0.0
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current cycle")
+        stop.set()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    
+    while not stop.is_set():
+        try:
+            # Re-read the feed list so edits apply without a restart, and
+            # pick up feeds moved here by a rebalance
+            urls = read_urls(config['rss']['urls_file'])
+            scheduler.sync(shard.assigned(urls) if shard else urls)
+            due = scheduler.due()
+            if due:
+                logger.info(f"Polling {len(due)} due feeds")
+                counts = process_feeds(
+                    due, config, fetcher, translator, summarizer, write_buffer, logger, deduplicator
+                )
+                for url in due:
+                    scheduler.record(url, counts.get(url))
+                scheduler.save()
+                count_backlog = time.monotonic() - backlog_counted_at >= backlog_interval
+                if count_backlog:
+                    backlog_counted_at = time.monotonic()
+                record_metrics(config, translator, summarizer, logger, supabase, worker_id, count_backlog)
+        except Exception as e:
+            logger.error(f"Daemon cycle error: {str(e)}")
+            logger.exception("Detailed error trace:")
+        stop.wait(min(max_sleep, scheduler.seconds_until_next()))
+    
+    scheduler.save()
+    logger.info("Daemon stopped")
+
 def main():
+    arguments = argparse.ArgumentParser(description="Fetch, translate and enrich RSS feeds")
+    arguments.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and poll each feed on an adaptive schedule instead of once"
+    )
+    arguments.add_argument(
+        "--stages",
+        type=parse_stages,
+        default=set(STAGES),
+        help=f"Comma-separated stages to run, any of {', '.join(STAGES)} (default: all)"
+    )
+    arguments.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Process only shard INDEX/COUNT of the feeds, for a fixed number of parallel workers"
+    )
+    args = arguments.parse_args()
+    if args.daemon and "fetch" not in args.stages:
+        arguments.error("--daemon polls feeds and needs the fetch stage")
+    
     # Load environment variables and configuration
     load_dotenv()
     config = load_config()
@@ -73,46 +243,85 @@ def main():
         config['logging']['directory']
     )
     
+    fetcher = None
+    shard = None
     try:
-        # Initialize Supabase client
-        supabase_url = os.environ.get("SUPABASE_URL")
-        supabase_key = os.environ.get("SUPABASE_KEY")
         mistral_api_key = os.environ.get("MISTRAL_API_KEY")
 
         # Validate environment variables
-        if not supabase_url or not supabase_key:
-            raise ValueError("SUPABASE_URL or SUPABASE_KEY not found in environment variables")
-        if not mistral_api_key:
+        if "enrich" in args.stages and not mistral_api_key:
             raise ValueError("MISTRAL_API_KEY not found in environment variables")
 
-        supabase = create_client(supabase_url, supabase_key)
+        # Supabase client, or a local database with the same interface
+        supabase = create_storage(config)
         
-        # Initialize components with validated credentials
-        fetcher = RSSFetcher(supabase, logger)
-        translator = RSSTranslator(supabase, logger)
-        summarizer = RSSSummarizer(
-            supabase=supabase,
-            mistral_api_key=mistral_api_key,
-            logger=logger,
-            config=config
-        )
+        # All stages share one buffer so rss_feeds writes go out in bulk
+        write_buffer = WriteBuffer.from_config(supabase, logger, config)
         
-        # Fetch new RSS entries
-        urls = read_urls(config['rss']['urls_file'])
-        for url in urls:
-            fetcher.fetch_and_save(url, config['rss']['default_history_days'])
+        # Initialize the selected stages, their API clients are created on first use
+        fetcher = RSSFetcher(supabase, logger, config, write_buffer) if "fetch" in args.stages else None
+        translator = RSSTranslator(supabase, logger, config, write_buffer) if "translate" in args.stages else None
+        summarizer = None
+        if "enrich" in args.stages:
+            summarizer = RSSSummarizer(
+                supabase=supabase,
+                mistral_api_key=mistral_api_key,
+                logger=logger,
+                config=config,
+                write_buffer=write_buffer
+            )
+        deduplicator = None
+        if config.get('dedup', {}).get('enabled', False):
+            deduplicator = Deduplicator(supabase, logger, config, write_buffer)
         
-        # Translate pending entries
-        translator.translate_entries(config['translation']['batch_size'])
+        # Feeds are split between workers, the backlog is shared through the work queues
+        shard = None
+        if args.shard:
+            shard = ShardCoordinator.static(*args.shard, logger)
+        elif args.daemon and (
+            config.get('sharding', {}).get('enabled', False)
+            or os.environ.get("ENABLE_SHARDING", "").lower() in ("1", "true", "yes")
+        ):
+            shard = ShardCoordinator.from_config(supabase, logger, config)
+        if shard:
+            for stage in (translator, summarizer):
+                if stage:
+                    stage.queue.shard = shard
+            if deduplicator:
+                deduplicator.shared = True
+            shard.start()
+            logger.info(f"Worker {shard.worker_id} of {shard.size}")
+        worker_id = shard.worker_id if shard else os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
         
-        # Summarize translated entries
-        summarizer.summarize_entries(config['summarization']['batch_size'])
+        if args.daemon:
+            metrics_config = config.get('metrics', {})
+            if metrics_config.get('serve', False):
+                # Expose /metrics, /stats and the profiler with live values
+                import web_ping
+                port = int(os.environ.get('PORT', metrics_config.get('port', 8080)))
+                web_ping.serve(port, metrics_config.get('profiler', False))
+                logger.info(f"Serving metrics on port {port}")
+            run_daemon(
+                config, fetcher, translator, summarizer, write_buffer, logger, deduplicator, shard, supabase, worker_id
+            )
+        else:
+            urls = read_urls(config['rss']['urls_file'])
+            if shard:
+                urls = shard.assigned(urls)
+            process_feeds(urls, config, fetcher, translator, summarizer, write_buffer, logger, deduplicator)
+            record_metrics(config, translator, summarizer, logger, supabase, worker_id)
         
     except ValueError as e:
         logger.error(f"Configuration error: {str(e)}")
     except Exception as e:
         logger.error(f"Application error: {str(e)}")
         logger.exception("Detailed error trace:")
+    finally:
+        # Stop the parse processes and leave the hash ring even when a run fails
+        if fetcher:
+            fetcher.close()
+        if shard:
+            shard.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,268 @@
+from collections import Counter as TallyCounter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+class Metric:
+    def __init__(self, name: str, help_text: str, metric_type: str):
+        self.name = name
+        self.help = help_text
+        self.type = metric_type
+        self._lock = threading.Lock()
+
+class Counter(Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, "counter")
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[dict]:
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+class Gauge(Counter):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+class Histogram(Metric):
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, "histogram")
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, dict] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[dict]:
+        with self._lock:
+            return [
+                {"labels": dict(key), "buckets": list(self.buckets), "counts": list(series["counts"]),
+                 "sum": series["sum"], "count": series["count"]}
+                for key, series in self._values.items()
+            ]
+
+class MetricsRegistry:
+    def __init__(self):
+        """Process-wide collection of counters, gauges and histograms"""
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help_text, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def snapshot(self) -> dict:
+        """JSON-serializable view of all metrics"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {"type": metric.type, "help": metric.help, "samples": metric.samples()}
+            for metric in metrics
+        }
+
+    def write_snapshot(self, path: str) -> None:
+        """Write the snapshot atomically, for a metrics endpoint running in another process"""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        descriptor, temp_file = tempfile.mkstemp(dir=directory or ".", prefix=f"{os.path.basename(path)}.")
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump({"written_at": time.time(), "metrics": self.snapshot()}, file)
+            os.replace(temp_file, path)
+        except BaseException:
+            os.unlink(temp_file)
+            raise
+
+    def publish(self, supabase: Any, worker_id: str, retention_seconds: float, table: str = "metrics_snapshots") -> None:
+        """
+        Store the snapshot in the database, for a metrics endpoint on another host.
+
+        Each worker keeps one row, rows not updated for retention_seconds are deleted.
+        """
+        now = time.time()
+        supabase.table(table).upsert({
+            "worker_id": worker_id,
+            "written_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+            "snapshot": json.dumps(self.snapshot())
+        }, on_conflict="worker_id").execute()
+        cutoff = datetime.fromtimestamp(now - retention_seconds, timezone.utc).isoformat()
+        supabase.table(table).delete().lt("written_at", cutoff).execute()
+
+def merge_snapshots(snapshots: Dict[str, dict]) -> dict:
+    """Combine the snapshots of several workers into one, every sample labelled with its worker"""
+    merged: Dict[str, dict] = {}
+    for worker, snapshot in sorted(snapshots.items()):
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {"type": metric["type"], "help": metric["help"], "samples": []})
+            target["samples"].extend(
+                {**sample, "labels": {**sample["labels"], "worker": worker}} for sample in metric["samples"]
+            )
+    return merged
+
+def _escape(value: str) -> str:
+    """Label value escaped for the Prometheus text format"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> str:
+    labels = {**labels, **(extra or {})}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+def render_prometheus(snapshot: dict) -> str:
+    """Render a snapshot in the Prometheus text exposition format"""
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for sample in metric["samples"]:
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(sample['labels'])} {sample['value']}")
+                continue
+            for bound, count in zip(sample["buckets"], sample["counts"]):
+                lines.append(f"{name}_bucket{_format_labels(sample['labels'], {'le': str(bound)})} {count}")
+            lines.append(f"{name}_bucket{_format_labels(sample['labels'], {'le': '+Inf'})} {sample['count']}")
+            lines.append(f"{name}_sum{_format_labels(sample['labels'])} {sample['sum']}")
+            lines.append(f"{name}_count{_format_labels(sample['labels'])} {sample['count']}")
+    return "\n".join(lines) + "\n"
+
+def summarize(snapshot: dict) -> dict:
+    """Compact JSON statistics: totals, averages and approximate percentiles per series"""
+    stats = {}
+    for name, metric in snapshot.items():
+        series = {}
+        for sample in metric["samples"]:
+            key = ",".join(f"{k}={v}" for k, v in sorted(sample["labels"].items())) or "total"
+            if metric["type"] != "histogram":
+                series[key] = sample["value"]
+                continue
+            count = sample["count"]
+            percentiles = {}
+            for percentile in (50, 95, 99):
+                target = count * percentile / 100
+                bound = next(
+                    (b for b, c in zip(sample["buckets"], sample["counts"]) if c >= target),
+                    float("inf")
+                )
+                percentiles[f"p{percentile}"] = bound if bound != float("inf") else None
+            series[key] = {"count": count, "avg": sample["sum"] / count if count else 0.0, **percentiles}
+        stats[name] = series
+    return stats
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.01, depth: int = 8):
+        """
+        Low-overhead profiler sampling the stacks of all threads of this process.
+
+        Args:
+            interval: Seconds between samples
+            depth: Innermost frames kept per sample
+        """
+        self.interval = interval
+        self.depth = depth
+        self.samples: TallyCounter = TallyCounter()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.samples.clear()
+        self.total = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = traceback.extract_stack(frame)[-self.depth:]
+                self.samples[" <- ".join(
+                    f"{os.path.basename(entry.filename)}:{entry.name}:{entry.lineno}" for entry in reversed(stack)
+                )] += 1
+                self.total += 1
+
+    def top(self, limit: int = 20) -> List[dict]:
+        """Most frequently sampled stacks, innermost frame first"""
+        return [
+            {"stack": stack, "samples": count, "share": count / self.total if self.total else 0.0}
+            for stack, count in self.samples.most_common(limit)
+        ]
+
+# Registry shared by all stages of this process
+METRICS = MetricsRegistry()
+
+STAGE_SECONDS = METRICS.histogram(
+    "rss_stage_duration_seconds", "Duration of pipeline operations by stage (fetch, parse, db, translate, llm)"
+)
+ITEMS = METRICS.counter("rss_items_total", "Items handled per stage and result")
+QUEUE_DEPTH = METRICS.gauge("rss_queue_depth", "Items waiting in in-memory queues")
+BACKLOG = METRICS.gauge("rss_backlog_entries", "Entries waiting in the database per stage")
+CACHE_REQUESTS = METRICS.counter("rss_cache_requests_total", "Cache lookups per cache and result")
+RATE_LIMIT_WAIT = METRICS.histogram("rss_rate_limiter_wait_seconds", "Time spent waiting for the LLM rate limiter")
+CACHE_HIT_RATIO = METRICS.gauge("rss_cache_hit_ratio", "Share of cache lookups answered from the cache")
+LIMITER_RATE = METRICS.gauge("rss_rate_limiter_rate", "Current LLM request rate in requests per second")
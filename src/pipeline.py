@@ -0,0 +1,176 @@
+from typing import Dict, List, Optional
+import logging
+import queue
+import threading
+from rss_fetcher import RSSFetcher
+from rss_translator import RSSTranslator
+from rss_summarizer import RSSSummarizer
+from write_buffer import WriteBuffer
+from deduplicator import Deduplicator
+from metrics import QUEUE_DEPTH
+
+# Marks the end of a stage queue
+STOP = None
+
+# Columns set by the translation stage, possibly not flushed yet when enrichment claims a row
+TRANSLATION_COLUMNS = ("title_en", "description_en", "translated_at")
+
+class StreamingPipeline:
+    def __init__(
+        self,
+        fetcher: RSSFetcher,
+        translator: RSSTranslator,
+        summarizer: RSSSummarizer,
+        write_buffer: WriteBuffer,
+        logger: logging.Logger,
+        config: dict,
+        deduplicator: Optional[Deduplicator] = None
+    ):
+        """
+        Stream new entries from the fetch stage through translation and enrichment.
+
+        Stages are connected by bounded in-memory queues, so a full queue
+        slows down the stage feeding it. Database polling is only used
+        afterwards, to recover entries left over from earlier runs.
+
+        Args:
+            fetcher: Fetch stage
+            translator: Translation stage
+            summarizer: Enrichment stage
+            write_buffer: Buffer shared by the stages
+            logger: Logger instance
+            config: Configuration dictionary
+            deduplicator: Links near-duplicates before translation, disabled if omitted
+        """
+        self.fetcher = fetcher
+        self.translator = translator
+        self.summarizer = summarizer
+        self.write_buffer = write_buffer
+        self.deduplicator = deduplicator
+        self.logger = logger
+        self.config = config.get('pipeline', {})
+        self.queue_size = self.config.get('queue_size', 20)
+        self.fetch_workers = self.config.get('fetch_workers', fetcher.max_workers)
+        self.translate_workers = self.config.get('translate_workers', 2)
+        self.enrich_workers = self.config.get('enrich_workers', summarizer.max_workers)
+        self.translate_batch_size = config['translation']['batch_size']
+        self.enrich_batch_size = config['summarization']['batch_size']
+        self.stats: Dict[str, int] = {"fetched": 0, "translated": 0, "enriched": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stage: str, amount: int) -> None:
+        with self._stats_lock:
+            self.stats[stage] += amount
+
+    def _put(self, stage_queue: queue.Queue, name: str, rows: List[dict]) -> None:
+        stage_queue.put(rows)
+        QUEUE_DEPTH.set(stage_queue.qsize(), queue=name)
+
+    def _get(self, stage_queue: queue.Queue, name: str) -> Optional[List[dict]]:
+        rows = stage_queue.get()
+        QUEUE_DEPTH.set(stage_queue.qsize(), queue=name)
+        return rows
+
+    def _chunks(self, rows: List[dict], size: int) -> List[List[dict]]:
+        return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+    def _fetch(self, url: str, default_days: int, translate_queue: queue.Queue) -> Optional[int]:
+        """Fetch and store one feed, then hand its rows to translation"""
+        result = self.fetcher.fetch_entries(url, default_days)
+        if result is None:
+            return None
+        entries, state = result
+        try:
+            rows = self.fetcher.save_entries(entries)
+        except Exception as e:
+            self.logger.error(f"Error saving entries from {url}: {str(e)}")
+            return None
+        self.fetcher.commit_feed_state({url: state})
+        if rows:
+            self.logger.info(f"Saved {len(rows)} entries from {url}")
+            self._count("fetched", len(rows))
+            # Duplicates get the canonical entry's results copied instead
+            new_rows = self.deduplicator.link(rows) if self.deduplicator else rows
+            for chunk in self._chunks(new_rows, self.translate_batch_size):
+                self._put(translate_queue, "translate", chunk)
+        return len(rows)
+
+    def _translate_worker(self, translate_queue: queue.Queue, enrich_queue: queue.Queue) -> None:
+        while (rows := self._get(translate_queue, "translate")) is not STOP:
+            try:
+                claimed = self.translator.claim_ids([row["id"] for row in rows])
+                translated = self.translator.translate_batch(claimed) if claimed else []
+                self._count("translated", len(translated))
+                for chunk in self._chunks(translated, self.enrich_batch_size):
+                    self._put(enrich_queue, "enrich", chunk)
+            except Exception as e:
+                self.logger.error(f"Error in translation stage: {str(e)}")
+
+    def _enrich_worker(self, enrich_queue: queue.Queue) -> None:
+        while (rows := self._get(enrich_queue, "enrich")) is not STOP:
+            try:
+                claimed = self.summarizer.claim_ids([row["id"] for row in rows])
+                if claimed:
+                    # Claimed rows may predate the buffered translation update
+                    translated = {row["id"]: row for row in rows}
+                    self.summarizer.enrich_batch([
+                        {**row, **{column: translated[row["id"]][column] for column in TRANSLATION_COLUMNS}}
+                        for row in claimed
+                    ])
+                    self._count("enriched", len(claimed))
+            except Exception as e:
+                self.logger.error(f"Error in enrichment stage: {str(e)}")
+
+    def run(self, urls: List[str], default_days: int) -> Dict[str, Optional[int]]:
+        """
+        Run all stages concurrently over the given feeds, then recover leftovers.
+
+        Args:
+            urls: Feed URLs to fetch
+            default_days: History window for feeds without a watermark
+
+        Returns:
+            Saved entry counts per URL, None for failed feeds
+        """
+        translate_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        enrich_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        translate_threads = [
+            threading.Thread(target=self._translate_worker, args=(translate_queue, enrich_queue), daemon=True)
+            for _ in range(self.translate_workers)
+        ]
+        enrich_threads = [
+            threading.Thread(target=self._enrich_worker, args=(enrich_queue,), daemon=True)
+            for _ in range(self.enrich_workers)
+        ]
+        for thread in translate_threads + enrich_threads:
+            thread.start()
+
+        self.translator.load_language_hints()
+        self.fetcher.load_watermarks(urls, default_days)
+        counts = self.fetcher.map_by_host(
+            lambda url: self._fetch(url, default_days, translate_queue), urls, self.fetch_workers
+        )
+        self.fetcher.save_feed_state([url for url, count in counts.items() if count is not None])
+
+        # Shut the stages down in order so every queued batch is processed
+        for _ in translate_threads:
+            translate_queue.put(STOP)
+        for thread in translate_threads:
+            thread.join()
+        for _ in enrich_threads:
+            enrich_queue.put(STOP)
+        for thread in enrich_threads:
+            thread.join()
+        self.write_buffer.flush()
+        self.logger.info(f"Streaming pipeline processed {self.stats}")
+
+        # Recover entries left over from earlier or failed runs
+        if self.deduplicator:
+            self.deduplicator.link_pending()
+        if self.translator.has_backlog():
+            self.translator.translate_entries(self.translate_batch_size)
+        if self.summarizer.has_backlog():
+            self.summarizer.summarize_entries(self.enrich_batch_size)
+        if self.deduplicator:
+            self.deduplicator.propagate()
+        return counts
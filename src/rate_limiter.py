@@ -0,0 +1,106 @@
+from typing import Optional
+import threading
+import time
+
+class TokenBucketLimiter:
+    def __init__(
+        self,
+        requests_per_second: float,
+        tokens_per_minute: Optional[int] = None,
+        burst: Optional[int] = None,
+        min_rate_factor: float = 0.1,
+        recovery_factor: float = 0.05
+    ):
+        """
+        Thread-safe token bucket limiting requests per second and LLM tokens per minute.
+
+        The request rate is halved whenever the API answers 429 and grows back
+        gradually with every successful request.
+
+        Args:
+            requests_per_second: Sustained request rate
+            tokens_per_minute: Sustained token budget, unlimited if None
+            burst: Number of requests that may be sent back to back, defaults to one second of requests
+            min_rate_factor: Lowest fraction of the configured rate after backing off
+            recovery_factor: Fraction of the configured rate regained per successful request
+        """
+        self.base_rate = requests_per_second
+        self.rate = requests_per_second
+        self.min_rate = requests_per_second * min_rate_factor
+        self.recovery_factor = recovery_factor
+        self.capacity = burst or max(1, int(requests_per_second))
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(self.capacity)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.wait_seconds = 0.0
+        self.rate_limited = 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.capacity, self._requests + elapsed * self.rate)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until a request costing the given number of tokens may be sent.
+
+        Args:
+            tokens: Estimated tokens used by the request
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(0.0, self._paused_until - now)
+                if wait == 0.0:
+                    if self._requests < 1:
+                        wait = (1 - self._requests) / self.rate
+                    elif self.tokens_per_minute and self._tokens < tokens:
+                        wait = (tokens - self._tokens) * 60 / self.tokens_per_minute
+                    else:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        waited = now - started
+                        self.wait_seconds += waited
+                        return waited
+            time.sleep(wait)
+
+    def adjust_tokens(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket once the real usage of a request is known"""
+        if self.tokens_per_minute:
+            with self._lock:
+                self._tokens = min(self.tokens_per_minute, self._tokens + estimated - actual)
+
+    def on_success(self) -> None:
+        """Let the request rate recover towards the configured rate"""
+        with self._lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * self.recovery_factor)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Back off after a 429 response, pausing all callers for retry_after seconds if given"""
+        with self._lock:
+            self.rate_limited += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._requests = min(self._requests, 0.0)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def stats(self) -> dict:
+        """Current rate and cumulative waiting of this limiter"""
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "wait_seconds": self.wait_seconds,
+                "rate_limited": self.rate_limited
+            }
@@ -1,36 +1,212 @@
 from datetime import datetime, timedelta
-from supabase import Client
-from typing import List
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlparse
+import math
+import multiprocessing
+import os
+import signal
+import threading
 import feedparser
+import requests
 from dateutil import parser
 import pytz
 import logging
 from html import unescape
 import re
+from write_buffer import WriteBuffer
+from bloom import BloomFilter
+from metrics import ITEMS, STAGE_SECONDS
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Date formats tried before falling back to dateutil, the one that works is cached per feed
+DATE_FORMATS = (
+    "%a, %d %b %Y %H:%M:%S %z",
+    "%a, %d %b %Y %H:%M:%S %Z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%d %H:%M:%S",
+)
+
+def clean_html(text: str) -> str:
+    """Remove HTML tags, special characters, and normalize text"""
+    if not text:
+        return ""
+    text = unescape(text)
+    # Remove HTML tags
+    clean = re.sub(r'<[^>]+>', '', text)
+    # Remove special characters like **, „, ", etc.
+    clean = re.sub(r'[„""**]', '', clean)
+    # Normalize whitespace
+    clean = ' '.join(clean.split())
+    return clean.strip()
+
+def make_timezone_aware(dt: datetime) -> datetime:
+    """Convert naive datetime to UTC timezone-aware datetime"""
+    if dt.tzinfo is None:
+        return pytz.UTC.localize(dt)
+    return dt.astimezone(pytz.UTC)
+
+def entry_date(entry: Any, date_format: Optional[str] = None) -> Tuple[datetime, Optional[str]]:
+    """
+    Publication date of a feed entry and the date format that parsed it.
+
+    Uses feedparser's pre-parsed UTC timestamp when available, then the
+    cached format of the feed, then the known formats, then dateutil.
+    """
+    parsed = entry.get("published_parsed")
+    if parsed:
+        return datetime(*parsed[:6], tzinfo=pytz.UTC), date_format
+
+    published = entry.published
+    for candidate in ([date_format] if date_format else []) + [fmt for fmt in DATE_FORMATS if fmt != date_format]:
+        try:
+            return make_timezone_aware(datetime.strptime(published, candidate)), candidate
+        except ValueError:
+            continue
+    return make_timezone_aware(parser.parse(published)), date_format
+
+def available_cpus() -> int:
+    """
+    CPUs this process may use.
+
+    cpu_count() reports the host's cores inside containers, so the affinity
+    mask and a cgroup v2 CPU quota, as set by container platforms, are
+    applied on top of it.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def _ignore_interrupts() -> None:
+    """Leave Ctrl+C to the main process, which stops the daemon gracefully"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def parse_feed(
+    content: bytes,
+    headers: Dict[str, str],
+    url: str,
+    latest_date: datetime,
+    state: Dict[str, Any],
+    max_entries: int,
+    seen_filter_bits: int
+) -> Dict[str, Any]:
+    """
+    Parse a downloaded feed into entry rows newer than the watermark.
+
+    Runs in a worker process, so it only takes and returns picklable values.
+
+    Args:
+        content: Raw feed document
+        headers: Response headers with lowercase names, used for the encoding and base URL
+        url: Feed URL, stored as source_url
+        latest_date: Watermark of the feed
+        state: Stored feed_state row with is_sorted, date_format and seen_filter
+        max_entries: Maximum number of entries returned
+        seen_filter_bits: Size of the seen-links filter
+
+    Returns:
+        Dictionary with the entries, the errors of skipped entries and the
+        updated is_sorted, date_format and seen_filter values
+    """
+    feed = feedparser.parse(content, response_headers=headers)
+    seen = BloomFilter.decode(state.get("seen_filter"), seen_filter_bits)
+    date_format = state.get("date_format")
+    entries = []
+    errors = []
+    previous_date = None
+    is_sorted = True
+    complete_scan = True
+
+    for entry in feed.entries:
+        try:
+            pub_date, date_format = entry_date(entry, date_format)
+            if previous_date is not None and pub_date > previous_date:
+                is_sorted = False
+            previous_date = pub_date
+
+            if pub_date <= latest_date:
+                # On feeds known to be newest-first everything below is old too
+                if state.get("is_sorted") and is_sorted:
+                    complete_scan = False
+                    break
+                continue
+
+            link = entry.get("link", "")
+            if link and link in seen:
+                continue
+            entries.append({
+                "title": clean_html(entry.get("title", "")),
+                "description": clean_html(entry.get("description", "")),
+                "link": link,
+                "pub_date": pub_date.isoformat(),
+                "source_url": url
+            })
+            if len(entries) >= max_entries:
+                complete_scan = False
+                break
+        except Exception as e:
+            errors.append(str(e))
+            continue
+
+    for entry in entries:
+        if entry["link"]:
+            seen.add(entry["link"])
+
+    return {
+        "entries": entries,
+        "errors": errors,
+        # A partial scan only proves the order of the part it read
+        "is_sorted": is_sorted if complete_scan or not is_sorted else state.get("is_sorted"),
+        "date_format": date_format,
+        "seen_filter": seen.encode()
+    }
 
 class RSSFetcher:
-    def __init__(self, supabase: Client, logger: logging.Logger):
+    def __init__(
+        self,
+        supabase: "Client",
+        logger: logging.Logger,
+        config: Optional[dict] = None,
+        write_buffer: Optional[WriteBuffer] = None
+    ):
         self.supabase = supabase
         self.logger = logger
-
-    def clean_html(self, text: str) -> str:
-        """Remove HTML tags, special characters, and normalize text"""
-        if not text:
-            return ""
-        text = unescape(text)
-        # Remove HTML tags
-        clean = re.sub(r'<[^>]+>', '', text)
-        # Remove special characters like **, „, ", etc.
-        clean = re.sub(r'[„""**]', '', clean)
-        # Normalize whitespace
-        clean = ' '.join(clean.split())
-        return clean.strip()
+        self.write_buffer = write_buffer or WriteBuffer(supabase, logger)
+        self.config = (config or {}).get('rss', {})
+        self.max_workers = self.config.get('max_workers', 16)
+        self.per_host_limit = self.config.get('per_host_limit', 4)
+        self.request_timeout = self.config.get('request_timeout_seconds', 20)
+        self.max_entries_per_fetch = self.config.get('max_entries_per_fetch', 100)
+        self.seen_filter_bits = self.config.get('seen_filter_bits', 8192)
+        # One parse process per usable core beyond the first, up to max_parse_workers,
+        # a single core parses in the download threads
+        parse_workers = self.config.get('parse_workers')
+        if parse_workers is None:
+            parse_workers = min(self.config.get('max_parse_workers', 4), available_cpus() - 1)
+        self.parse_workers = max(0, parse_workers)
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self.feed_state: Dict[str, Dict[str, Optional[str]]] = {}
+        self.watermarks: Dict[str, datetime] = {}
+        self.watermarks_loaded = False
+        self._state_lock = threading.Lock()
+        self._sessions = threading.local()
 
     def make_timezone_aware(self, dt: datetime) -> datetime:
         """Convert naive datetime to UTC timezone-aware datetime"""
-        if dt.tzinfo is None:
-            return pytz.UTC.localize(dt)
-        return dt.astimezone(pytz.UTC)
+        return make_timezone_aware(dt)
 
     def get_latest_entry_date(self, source_url: str, default_days: int) -> datetime:
         """Get the latest publication date for a given source URL"""
@@ -41,7 +217,7 @@ class RSSFetcher:
                 .order("pub_date", desc=True)\
                 .limit(1)\
                 .execute()
-            
+
             if result.data and result.data[0].get("pub_date"):
                 return self.make_timezone_aware(parser.parse(result.data[0]["pub_date"]))
             return self.make_timezone_aware(datetime.now() - timedelta(days=default_days))
@@ -49,34 +225,297 @@ class RSSFetcher:
             self.logger.error(f"Error getting latest entry date: {str(e)}")
             return self.make_timezone_aware(datetime.now() - timedelta(days=default_days))
 
-    def fetch_and_save(self, url: str, default_days: int) -> None:
-        """Fetch RSS entries and save to database"""
+    def load_feed_state(self) -> None:
+        """Load stored validators and watermarks for all feeds in one request"""
         try:
-            latest_date = self.get_latest_entry_date(url, default_days)
-            feed = feedparser.parse(url)
-            entries = []
-
-            for entry in feed.entries:
-                try:
-                    pub_date = self.make_timezone_aware(parser.parse(entry.published))
-                    if pub_date > latest_date:
-                        entries.append({
-                            "title": self.clean_html(entry.get("title", "")),
-                            "description": self.clean_html(entry.get("description", "")),
-                            "link": entry.get("link", ""),
-                            "pub_date": pub_date.isoformat(),
-                            "source_url": url
-                        })
-                except Exception as e:
-                    self.logger.warning(f"Error processing entry: {str(e)}")
-                    continue
+            result = self.supabase.table("feed_state")\
+                .select("source_url", "etag", "last_modified", "latest_pub_date", "is_sorted", "date_format", "seen_filter")\
+                .execute()
+            with self._state_lock:
+                self.feed_state = {row["source_url"]: row for row in result.data}
+                for row in result.data:
+                    if row.get("latest_pub_date"):
+                        self.watermarks[row["source_url"]] = self.make_timezone_aware(
+                            parser.parse(row["latest_pub_date"])
+                        )
+            self.logger.info(f"Loaded feed state for {len(self.feed_state)} feeds")
+        except Exception as e:
+            self.logger.warning(f"Error loading feed state, conditional requests disabled: {str(e)}")
+
+    def load_watermarks(self, urls: List[str], default_days: int) -> None:
+        """Preload the latest publication date of every feed into the watermark map"""
+        self.start_parse_workers()
+        self.load_feed_state()
+        missing = [url for url in urls if url not in self.watermarks]
+        if missing:
+            # Feeds unknown to feed_state are seeded with one grouped query
+            try:
+                result = self.supabase.rpc("latest_pub_dates").execute()
+                with self._state_lock:
+                    for row in result.data:
+                        if row["source_url"] in missing and row.get("latest_pub_date"):
+                            self.watermarks[row["source_url"]] = self.make_timezone_aware(
+                                parser.parse(row["latest_pub_date"])
+                            )
+            except Exception as e:
+                self.logger.warning(f"Error loading watermarks in bulk, falling back to per-feed queries: {str(e)}")
+                for url in missing:
+                    self.watermarks[url] = self.get_latest_entry_date(url, default_days)
+        self.watermarks_loaded = True
+
+    def get_watermark(self, source_url: str, default_days: int) -> datetime:
+        """Return the watermark of a feed from the preloaded map"""
+        if not self.watermarks_loaded:
+            return self.get_latest_entry_date(source_url, default_days)
+        with self._state_lock:
+            watermark = self.watermarks.get(source_url)
+        if watermark is None:
+            return self.make_timezone_aware(datetime.now() - timedelta(days=default_days))
+        return watermark
+
+    def save_feed_state(self, urls: List[str]) -> None:
+        """Persist validators and watermarks of the given feeds"""
+        with self._state_lock:
+            rows = [self.feed_state[url] for url in urls if url in self.feed_state]
+        if not rows:
+            return
+        try:
+            self.supabase.table("feed_state")\
+                .upsert(rows, on_conflict="source_url")\
+                .execute()
+        except Exception as e:
+            self.logger.warning(f"Error saving feed state: {str(e)}")
+
+    def _get_session(self) -> requests.Session:
+        """Return a per-thread HTTP session so connections are reused"""
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers["User-Agent"] = "rss-office/1.0 (+feedparser)"
+            self._sessions.session = session
+        return session
+
+    def download_feed(self, url: str) -> Optional[requests.Response]:
+        """Download a feed with a conditional GET, returns None if unchanged"""
+        headers = {}
+        with self._state_lock:
+            state = self.feed_state.get(url, {})
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        with STAGE_SECONDS.time(stage="fetch"):
+            response = self._get_session().get(url, headers=headers, timeout=self.request_timeout)
+
+        if response.status_code == 304:
+            self.logger.debug(f"Feed not modified: {url}")
+            return None
+        response.raise_for_status()
+        return response
+
+    def response_headers(self, response: requests.Response) -> Dict[str, str]:
+        """
+        Response headers in the form feedparser reads them.
+
+        feedparser only looks up lowercase names, so the charset of
+        content-type would otherwise be ignored. content-location defaults
+        to the final URL so relative links resolve as with feedparser.parse(url).
+        """
+        headers = {name.lower(): value for name, value in response.headers.items()}
+        headers.setdefault("content-location", response.url)
+        return headers
+
+    def _get_parse_pool(self) -> ProcessPoolExecutor:
+        with self._state_lock:
+            if self._parse_pool is None:
+                # Workers are forked from a clean server process with this module preloaded,
+                # so they start fast and do not inherit locks held by the download threads
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+                self._parse_pool = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=context,
+                    initializer=_ignore_interrupts
+                )
+                # Start the workers now instead of on the first parse
+                for _ in range(self.parse_workers):
+                    self._parse_pool.submit(int)
+            return self._parse_pool
+
+    def start_parse_workers(self) -> None:
+        """Start the parse processes ahead of the downloads"""
+        if self.parse_workers:
+            self._get_parse_pool()
+
+    def parse(
+        self,
+        content: bytes,
+        headers: Dict[str, str],
+        url: str,
+        latest_date: datetime,
+        state: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Parse a downloaded feed in the process pool, or in this thread if parse_workers is 0"""
+        arguments = (content, headers, url, latest_date, state, self.max_entries_per_fetch, self.seen_filter_bits)
+        if not self.parse_workers:
+            return parse_feed(*arguments)
+        try:
+            return self._get_parse_pool().submit(parse_feed, *arguments).result()
+        except BrokenProcessPool:
+            # A worker died, start a fresh pool for the next feeds
+            self.logger.warning("Parse worker process died, restarting the pool")
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Stop the parse worker processes"""
+        with self._state_lock:
+            pool, self._parse_pool = self._parse_pool, None
+        if pool:
+            pool.shutdown()
+
+    def fetch_entries(self, url: str, default_days: int) -> Optional[Tuple[List[dict], Optional[dict]]]:
+        """
+        Fetch RSS entries newer than the feed watermark.
+
+        The feed's validators, watermark and seen filter are not updated
+        here. They are returned as the proposed feed_state row, for
+        commit_feed_state once the entries are stored, so entries that fail
+        to save are fetched again.
+
+        Returns:
+            The new entries and the proposed feed state, None as state if the
+            feed was not modified, or None on failure
+        """
+        try:
+            response = self.download_feed(url)
+            if response is None:
+                ITEMS.inc(stage="fetch", result="not_modified")
+                return [], None
+
+            latest_date = self.get_watermark(url, default_days)
+            with self._state_lock:
+                state = dict(self.feed_state.get(url, {}))
+                watermark = self.watermarks.get(url)
+            with STAGE_SECONDS.time(stage="parse"):
+                parsed = self.parse(response.content, self.response_headers(response), url, latest_date, state)
+            for error in parsed["errors"]:
+                self.logger.warning(f"Error processing entry: {error}")
+            entries = parsed["entries"]
+            ITEMS.inc(stage="fetch", result="ok")
+            ITEMS.inc(len(entries), stage="parse", result="new")
 
             if entries:
-                self.supabase.table("rss_feeds").upsert(
-                    entries,
-                    on_conflict="link,source_url"
-                ).execute()
-                self.logger.info(f"Saved {len(entries)} entries from {url}")
+                watermark = max([parser.parse(entry["pub_date"]) for entry in entries] + [latest_date])
+            return entries, {
+                "source_url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "latest_pub_date": watermark.isoformat() if watermark else None,
+                "is_sorted": parsed["is_sorted"],
+                "date_format": parsed["date_format"],
+                "seen_filter": parsed["seen_filter"]
+            }
 
         except Exception as e:
-            self.logger.error(f"Error fetching RSS from {url}: {str(e)}") 
\ No newline at end of file
+            ITEMS.inc(stage="fetch", result="error")
+            self.logger.error(f"Error fetching RSS from {url}: {str(e)}")
+            return None
+
+    def commit_feed_state(self, states: Dict[str, Optional[dict]]) -> None:
+        """Adopt the feed states proposed by fetch_entries, once their entries are stored"""
+        with self._state_lock:
+            for url, state in states.items():
+                if state is None:
+                    continue
+                self.feed_state[url] = state
+                if state.get("latest_pub_date"):
+                    self.watermarks[url] = self.make_timezone_aware(parser.parse(state["latest_pub_date"]))
+
+    def fetch_and_save(self, url: str, default_days: int) -> Optional[Tuple[int, Optional[dict]]]:
+        """Fetch RSS entries and queue them for saving, returns the number of new entries and the proposed feed state"""
+        result = self.fetch_entries(url, default_days)
+        if result is None:
+            return None
+        entries, state = result
+        if entries:
+            self.write_buffer.add_inserts(entries, on_conflict="link,source_url")
+            self.logger.info(f"Queued {len(entries)} entries from {url}")
+        return len(entries), state
+
+    def save_entries(self, entries: List[dict]) -> List[dict]:
+        """Upsert entries right away, returns the stored rows with their ids"""
+        if not entries:
+            return []
+        with STAGE_SECONDS.time(stage="db", operation="insert"):
+            result = self.supabase.table("rss_feeds")\
+                .upsert(entries, on_conflict="link,source_url")\
+                .execute()
+        return result.data
+
+    def map_by_host(self, function: Callable[[str], Any], urls: List[str], max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run function over feed URLs concurrently, at most per_host_limit at a time per host.
+
+        Feeds of a busy host wait in their host's queue instead of holding a
+        worker thread, so feeds of other hosts keep going. Hosts are served
+        round-robin, so a host with many feeds does not delay the others.
+
+        Args:
+            function: Function called with each URL
+            urls: Feed URLs
+            max_workers: Concurrent calls in total, defaults to max_workers of the rss section
+
+        Returns:
+            Result of function by URL
+        """
+        max_workers = max_workers or self.max_workers
+        queues: Dict[str, deque] = {}
+        for url in urls:
+            queues.setdefault(urlparse(url).netloc, deque()).append(url)
+        active: Counter = Counter()
+        running: Dict[Future, Tuple[str, str]] = {}
+        results: Dict[str, Any] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while queues or running:
+                submitted = True
+                while submitted and len(running) < max_workers:
+                    submitted = False
+                    for host in list(queues):
+                        if len(running) >= max_workers:
+                            break
+                        if active[host] >= self.per_host_limit:
+                            continue
+                        url = queues[host].popleft()
+                        if not queues[host]:
+                            del queues[host]
+                        running[executor.submit(function, url)] = (url, host)
+                        active[host] += 1
+                        submitted = True
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, host = running.pop(future)
+                    active[host] -= 1
+                    results[url] = future.result()
+        return results
+
+    def fetch_all(self, urls: List[str], default_days: int) -> Dict[str, Optional[int]]:
+        """Fetch all feeds concurrently, returns saved entry counts per URL (None on failure)"""
+        self.load_watermarks(urls, default_days)
+        results = self.map_by_host(lambda url: self.fetch_and_save(url, default_days), urls)
+        counts = {url: None if result is None else result[0] for url, result in results.items()}
+
+        # Only remember validators and watermarks once the entries are stored,
+        # otherwise a failed save would be hidden behind a 304 or the watermark
+        if self.write_buffer.flush():
+            self.commit_feed_state({url: result[1] for url, result in results.items() if result is not None})
+            self.save_feed_state([url for url, count in counts.items() if count is not None])
+        else:
+            self.logger.error("Some entries could not be saved, feed state left unchanged")
+
+        failed = sum(1 for count in counts.values() if count is None)
+        self.logger.info(
+            f"Fetched {len(urls)} feeds: {sum(c for c in counts.values() if c)} new entries, {failed} failed"
+        )
+        return counts
@@ -1,14 +1,43 @@
-from mistralai import Mistral
-from supabase import Client
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
-from typing import List, Optional, Dict, Any
-import time
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
 import backoff
+import json
+import os
+import re
+import threading
+from write_buffer import WriteBuffer
+from cache import fingerprint, open_cache
+from rate_limiter import TokenBucketLimiter
+from work_queue import WorkQueue, timestamp
+from metrics import ITEMS, RATE_LIMIT_WAIT, STAGE_SECONDS
+
+if TYPE_CHECKING:
+    from category_classifier import CategoryClassifier
+    from mistralai import Mistral
+    from supabase import Client
+
+# Part of the response cache key, bump it when a prompt changes so older answers are not reused
+PROMPT_VERSION = "1"
+
+# Generated field -> column recording when it was generated
+FIELD_TIMESTAMPS = {
+    "ai_title": "ai_title_generated_at",
+    "category": "category_generated_at",
+    "summary": "summarized_at"
+}
 
 class RSSSummarizer:
-    def __init__(self, supabase: Client, mistral_api_key: str, logger: logging.Logger, config: dict):
+    def __init__(
+        self,
+        supabase: "Client",
+        mistral_api_key: str,
+        logger: logging.Logger,
+        config: dict,
+        write_buffer: Optional[WriteBuffer] = None
+    ):
         """
         Initialize RSSSummarizer with required clients and configuration.
         
@@ -17,59 +46,150 @@ class RSSSummarizer:
             mistral_api_key: API key for Mistral AI
             logger: Logger instance
             config: Configuration dictionary
+            write_buffer: Shared buffer for rss_feeds writes, a private one is created if omitted
         """
         self.supabase = supabase
-        self.mistral = Mistral(api_key=mistral_api_key)
+        self.write_buffer = write_buffer or WriteBuffer(supabase, logger)
+        self.queue = WorkQueue(supabase, logger, "enrich", config)
+        self.mistral_api_key = mistral_api_key
+        self._mistral = None
+        self._client_lock = threading.Lock()
         self.logger = logger
         self.config = config['summarization']
-        self.last_request_time = 0
-        self.min_request_interval = self.config.get('min_request_interval', 1.0)  # seconds
+        self.max_workers = self.config.get('max_workers', 4)
+        self.max_tokens = self.config.get('max_tokens', 500)
+        self.mode = self.config.get('mode', 'combined')
+        self.reask_attempts = self.config.get('reask_attempts', 1)
+        self.summary_backfill_days = self.config.get('summary_backfill_days', 2)
+        batching = self.config.get('batching', {})
+        self.max_articles_per_request = batching.get('max_articles_per_request', 10)
+        self.max_prompt_tokens = batching.get('max_prompt_tokens', 6000)
+        self.batch_max_tokens = batching.get('max_tokens', 2500)
+        self.output_tokens_per_article = batching.get('output_tokens_per_article', 150)
+        self.limiter = TokenBucketLimiter(
+            requests_per_second=self.config.get('requests_per_second', 1.0),
+            tokens_per_minute=self.config.get('tokens_per_minute')
+        )
+        self.cache = None
+        cache_config = self.config.get('cache', {})
+        if cache_config.get('enabled', False):
+            self.cache = open_cache(cache_config, 'cache/llm.sqlite3', name="llm")
+        # Bypassing skips cached answers but still stores fresh ones
+        self.cache_bypass = cache_config.get('bypass', False) \
+            or os.environ.get("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+        self.full_config = config
+        self.classifier_enabled = self.config.get('classifier', {}).get('enabled', False)
+        self._classifier = None
+
+    @property
+    def mistral(self) -> "Mistral":
+        """Mistral client, created on first use so runs without enrichment work skip loading the SDK"""
+        if self._mistral is None:
+            with self._client_lock:
+                if self._mistral is None:
+                    from mistralai import Mistral
+                    self._mistral = Mistral(api_key=self.mistral_api_key)
+        return self._mistral
+
+    @mistral.setter
+    def mistral(self, client: "Mistral") -> None:
+        self._mistral = client
+
+    @property
+    def classifier(self) -> Optional["CategoryClassifier"]:
+        """Local category classifier, None if disabled, loaded on first use like the Mistral client"""
+        if self._classifier is None and self.classifier_enabled:
+            with self._client_lock:
+                if self._classifier is None:
+                    # numpy and the saved model are only loaded when entries are enriched
+                    from category_classifier import CategoryClassifier
+                    self._classifier = CategoryClassifier(self.supabase, self.logger, self.full_config)
+        return self._classifier
+
+    @classifier.setter
+    def classifier(self, classifier: Optional["CategoryClassifier"]) -> None:
+        self._classifier = classifier
 
     def get_unsummarized_entries(self, batch_size: int = 5) -> List[Dict[str, Any]]:
         """
-        Fetch entries that haven't been processed yet.
+        Claim entries that haven't been processed yet.
         
         Args:
-            batch_size: Number of entries to fetch
+            batch_size: Number of entries to claim
             
         Returns:
             List of unprocessed entries
         """
-        try:
-            result = self.supabase.table("rss_feeds")\
-                .select("id", "title", "description")\
-                .is_("summarized_at", "null")\
-                .is_("ai_title_generated_at", "null")\
-                .is_("category_generated_at", "null")\
-                .not_.is_("translated_at", "null")\
-                .limit(batch_size)\
-                .execute()
-            return result.data
-        except Exception as e:
-            self.logger.error(f"Error fetching unsummarized entries: {e}")
-            return []
+        return self.queue.claim(
+            batch_size,
+            lambda query: query
+                .is_("summarized_at", "null")
+                .is_("ai_title_generated_at", "null")
+                .is_("category_generated_at", "null")
+                .not_.is_("translated_at", "null")
+                .is_("canonical_id", "null")
+        )
 
     def get_entries_with_missing_data(self, batch_size: int = 5) -> List[Dict[str, Any]]:
         """
-        Fetch entries that have missing AI titles or categories.
+        Claim entries that have missing AI titles or categories, or summaries in combined mode.
         
         Args:
-            batch_size: Number of entries to fetch
+            batch_size: Number of entries to claim
             
         Returns:
             List of entries with missing data
         """
+        return self.queue.claim(batch_size, self._translated, alternatives=self._missing_conditions())
+
+    def claim_ids(self, ids: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Claim the given entries if they still miss generated fields.
+
+        Translation is not required here, the streaming pipeline hands over
+        entries whose translation update may still be buffered.
+        """
+        return self.queue.claim_ids(
+            ids, lambda query: query.is_("canonical_id", "null"), alternatives=self._missing_conditions()
+        )
+
+    def _translated(self, query):
+        return query.not_.is_("translated_at", "null").is_("canonical_id", "null")
+
+    def _missing_conditions(self) -> List[str]:
+        missing = ["ai_title_generated_at.is.null", "category_generated_at.is.null"]
+        if self.mode in ("combined", "batched"):
+            # Summaries were not generated before, only recent entries lacking one count as missing
+            if self.summary_backfill_days is None:
+                missing.append("summarized_at.is.null")
+            else:
+                since = timestamp(datetime.now(pytz.UTC) - timedelta(days=self.summary_backfill_days))
+                missing.append(f"and(summarized_at.is.null,pub_date.gte.{since})")
+        return missing
+
+    def backlog_size(self, count: str = "planned") -> Optional[int]:
+        """Number of translated entries still missing generated fields, counted with the given PostgREST count method"""
+        return self.queue.backlog(self._translated, alternatives=self._missing_conditions(), count=count)
+
+    def has_backlog(self) -> bool:
+        """Check whether any translated entry is still missing generated fields"""
+        return self.queue.has_backlog(self._translated, alternatives=self._missing_conditions())
+
+    def estimate_tokens(self, text: str) -> int:
+        """Rough token count of a text, about 4 characters per token"""
+        return len(text) // 4 + 1
+
+    def _is_rate_limited(self, error: Exception) -> bool:
+        """Check whether an API error is a 429 response"""
+        return getattr(error, "status_code", None) == 429 or "Status 429" in str(error)
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        """Seconds to wait according to the Retry-After header of an API error, if any"""
+        response = getattr(error, "raw_response", None)
         try:
-            result = self.supabase.table("rss_feeds")\
-                .select("id", "title", "description")\
-                .or_("ai_title_generated_at.is.null,category_generated_at.is.null")\
-                .not_.is_("translated_at", "null")\
-                .limit(batch_size)\
-                .execute()
-            return result.data
-        except Exception as e:
-            self.logger.error(f"Error fetching entries with missing data: {e}")
-            return []
+            return float(response.headers.get("retry-after")) if response is not None else None
+        except (TypeError, ValueError):
+            return None
 
     @backoff.on_exception(
         backoff.expo,
@@ -77,33 +197,49 @@ class RSSSummarizer:
         max_tries=3,
         max_time=30
     )
-    def _make_mistral_request(self, messages: List[Dict[str, str]]) -> Optional[str]:
+    def _make_mistral_request(
+        self,
+        messages: List[Dict[str, str]],
+        json_mode: bool = False,
+        max_tokens: Optional[int] = None
+    ) -> Optional[str]:
         """
-        Make a request to Mistral AI with rate limiting and exponential backoff retry.
+        Make a request to Mistral AI through the shared rate limiter, with exponential backoff retry.
         
         Args:
             messages: List of message dictionaries for the chat completion
+            json_mode: Ask the model for a JSON object response
+            max_tokens: Completion budget, defaults to the configured max_tokens
             
         Returns:
             Generated content or None if failed
         """
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last_request
-            time.sleep(sleep_time)
+        max_tokens = max_tokens or self.max_tokens
+        estimated_tokens = sum(self.estimate_tokens(message["content"]) for message in messages) + max_tokens
+        RATE_LIMIT_WAIT.observe(self.limiter.acquire(estimated_tokens))
         
         try:
-            response = self.mistral.chat.complete(
-                model=self.config['model'],
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-            self.last_request_time = time.time()  # Update last request time
+            with STAGE_SECONDS.time(stage="llm"):
+                response = self.mistral.chat.complete(
+                    model=self.config['model'],
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=max_tokens,
+                    response_format={"type": "json_object"} if json_mode else None
+                )
+            self.limiter.on_success()
+            ITEMS.inc(stage="llm", result="ok")
+            if getattr(response, "usage", None) and response.usage.total_tokens:
+                self.limiter.adjust_tokens(estimated_tokens, response.usage.total_tokens)
             return response.choices[0].message.content.strip() if response.choices else None
         except Exception as e:
-            self.logger.error(f"Error in Mistral API request: {e}")
+            if self._is_rate_limited(e):
+                ITEMS.inc(stage="llm", result="rate_limited")
+                self.limiter.on_rate_limited(self._retry_after(e))
+                self.logger.warning(f"Mistral API rate limit hit, request rate lowered to {self.limiter.rate:.2f}/s")
+            else:
+                ITEMS.inc(stage="llm", result="error")
+                self.logger.error(f"Error in Mistral API request: {e}")
             raise
 
     def create_summary(self, title: str, description: str) -> Optional[str]:
@@ -194,73 +330,385 @@ class RSSSummarizer:
         self.logger.warning(f"Invalid category returned: {category}")
         return None
 
+    def _field_instructions(self, fields: List[str]) -> str:
+        """Describe each requested JSON field for the enrichment prompt"""
+        instructions = {
+            "ai_title": "a concise, engaging title IN ENGLISH (maximum 100 characters) that captures the main point",
+            "category": "exactly ONE category from this list, written exactly as listed: "
+                        + ", ".join(self.config['categories']),
+            "summary": "a summary IN ENGLISH in 2-3 concise sentences, maximum 50 words, focused on the most important point"
+        }
+        return "\n".join(f'- "{field}": {instructions[field]}' for field in fields)
+
+    def validate_enrichment(self, data: Dict[str, Any], fields: List[str]) -> Dict[str, str]:
+        """
+        Keep only the requested fields that hold valid values.
+        
+        Args:
+            data: Parsed model response
+            fields: Requested fields
+            
+        Returns:
+            Valid field values
+        """
+        valid = {}
+        for field in fields:
+            value = data.get(field)
+            if not isinstance(value, str) or not value.strip():
+                continue
+            value = value.strip()
+            if field == "category" and value not in self.config['categories']:
+                self.logger.warning(f"Invalid category returned: {value}")
+                continue
+            if field == "ai_title" and len(value) > 150:
+                continue
+            valid[field] = value
+        return valid
+
+    def parse_json_response(self, content: Optional[str]) -> Any:
+        """Parse a JSON model response, tolerating markdown code fences"""
+        if not content:
+            return None
+        content = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            self.logger.warning("Model returned invalid JSON")
+            return None
+
+    def create_enrichment(self, title: str, description: str, fields: List[str]) -> Dict[str, str]:
+        """
+        Generate several fields of an article in one JSON request.
+        
+        Fields that are missing or invalid in the response are requested again,
+        alone, up to reask_attempts times.
+        
+        Args:
+            title: Article title
+            description: Article description
+            fields: Fields to generate, any of ai_title, category and summary
+            
+        Returns:
+            Valid generated fields, possibly fewer than requested
+        """
+        result: Dict[str, str] = {}
+        remaining = list(fields)
+        for _ in range(1 + self.reask_attempts):
+            messages = [{
+                "role": "user",
+                "content": f"""Analyze this article and respond with a JSON object containing these fields:
+            {self._field_instructions(remaining)}
+
+            Article Title: {title}
+            Article Content: {description}
+            
+            Always write in English regardless of the input language.
+            Respond with only the JSON object, no additional text."""
+            }]
+            data = self.parse_json_response(self._make_mistral_request(messages, json_mode=True))
+            if isinstance(data, dict):
+                result.update(self.validate_enrichment(data, remaining))
+            remaining = [field for field in fields if field not in result]
+            if not remaining:
+                break
+        return result
+
+    def missing_fields(self, entry: Dict[str, Any]) -> List[str]:
+        """Fields of an entry that have not been generated yet"""
+        return [field for field, column in FIELD_TIMESTAMPS.items() if entry.get(column) is None]
+
+    def cache_key(self, entry: Dict[str, Any], field: str) -> str:
+        """Cache key of a generated field, insensitive to whitespace differences in the article"""
+        # Category answers also depend on the list of categories offered
+        choices = ",".join(self.config['categories']) if field == "category" else ""
+        return fingerprint(
+            self.config['model'],
+            PROMPT_VERSION,
+            field,
+            choices,
+            ' '.join((entry["title"] or "").split()),
+            ' '.join((entry["description"] or "").split())
+        )
+
+    def cached_fields(self, entry: Dict[str, Any], fields: List[str]) -> Dict[str, str]:
+        """
+        Values generated earlier for the same article text, so each field is reused
+        even when it was generated by a request for different fields.
+        
+        Args:
+            entry: Entry with title and description
+            fields: Fields to look up
+            
+        Returns:
+            Cached values of the fields found
+        """
+        if not self.cache or self.cache_bypass:
+            return {}
+        cached = {}
+        for field in fields:
+            if (value := self.cache.get(self.cache_key(entry, field))) is not None:
+                cached[field] = value
+        return cached
+
+    def classify_locally(self, entries: List[Dict[str, Any]]) -> Dict[Any, str]:
+        """Categories the local classifier is confident about, keyed by entry id, the rest is left to the LLM"""
+        if not self.classifier or not entries:
+            return {}
+        try:
+            return self.classifier.predict(entries)
+        except Exception as e:
+            self.logger.warning(f"Local category classification failed: {e}")
+            return {}
+
+    def generated_update(self, generated: Dict[str, str], current_time: str, local: bool = False) -> Dict[str, Any]:
+        """Columns recording generated fields, and whether the category came from the local classifier"""
+        update_data = {}
+        for field, value in generated.items():
+            update_data.update({field: value, FIELD_TIMESTAMPS[field]: current_time})
+        if "category" in generated:
+            # The local classifier only trains on categories chosen by the LLM
+            update_data["category_source"] = "local" if local else "llm"
+        return update_data
+
+    def remember_fields(self, entry: Dict[str, Any], generated: Dict[str, str]) -> None:
+        """Store freshly generated values of an entry in the response cache"""
+        if self.cache:
+            for field, value in generated.items():
+                self.cache.set(self.cache_key(entry, field), value)
+
+    def pack_entries(self, entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Split entries into groups that fit one batched request.
+        
+        A group grows until the prompt would exceed max_prompt_tokens, the
+        expected output would exceed the batch max_tokens, or it holds
+        max_articles_per_request articles.
+        
+        Args:
+            entries: Entries to enrich
+            
+        Returns:
+            Groups of entries
+        """
+        overhead = self.estimate_tokens(self._field_instructions(list(FIELD_TIMESTAMPS))) + 150
+        groups: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        prompt_tokens = overhead
+        for entry in entries:
+            article_tokens = self.estimate_tokens(entry["title"] or "") + self.estimate_tokens(entry["description"] or "") + 20
+            if current and (
+                len(current) >= self.max_articles_per_request
+                or prompt_tokens + article_tokens > self.max_prompt_tokens
+                or (len(current) + 1) * self.output_tokens_per_article > self.batch_max_tokens
+            ):
+                groups.append(current)
+                current, prompt_tokens = [], overhead
+            current.append(entry)
+            prompt_tokens += article_tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def create_batch_enrichment(self, entries: List[Dict[str, Any]]) -> Dict[Any, Dict[str, str]]:
+        """
+        Generate the missing fields of several articles in one JSON request.
+        
+        Args:
+            entries: Entries with id, title, description and generation timestamps
+            
+        Returns:
+            Valid generated fields keyed by entry id, entries without valid results are omitted
+        """
+        articles = "\n\n".join(
+            f"""Article ID: {entry['id']}
+            Fields: {", ".join(self.missing_fields(entry))}
+            Title: {entry['title']}
+            Content: {entry['description']}"""
+            for entry in entries
+        )
+        messages = [{
+            "role": "user",
+            "content": f"""Analyze each of the following articles and produce the requested fields for it:
+            {self._field_instructions(list(FIELD_TIMESTAMPS))}
+
+            {articles}
+            
+            Always write in English regardless of the input language.
+            Respond with only a JSON object of the form {{"results": [{{"id": <Article ID>, <field>: <value>, ...}}, ...]}},
+            with one result per article containing only the fields listed for that article."""
+        }]
+        max_tokens = min(self.batch_max_tokens, len(entries) * self.output_tokens_per_article + 100)
+        data = self.parse_json_response(self._make_mistral_request(messages, json_mode=True, max_tokens=max_tokens))
+        results = data.get("results") if isinstance(data, dict) else data
+        if not isinstance(results, list):
+            return {}
+
+        entries_by_id = {str(entry["id"]): entry for entry in entries}
+        enrichments = {}
+        for result in results:
+            if not isinstance(result, dict) or str(result.get("id")) not in entries_by_id:
+                continue
+            entry = entries_by_id[str(result["id"])]
+            if valid := self.validate_enrichment(result, self.missing_fields(entry)):
+                enrichments[entry["id"]] = valid
+        return enrichments
+
+    def process_group(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Enrich a group of entries with one batched request, falling back to
+        one request per entry for articles whose results are missing or invalid.
+        
+        Args:
+            entries: Entries with id, title, description and generation timestamps
+        """
+        current_time = datetime.now(pytz.UTC).isoformat()
+        cached = {entry["id"]: self.cached_fields(entry, self.missing_fields(entry)) for entry in entries}
+        local = self.classify_locally([
+            entry for entry in entries
+            if "category" in self.missing_fields(entry) and "category" not in cached[entry["id"]]
+        ])
+        for entry_id, category in local.items():
+            cached[entry_id]["category"] = category
+        # Only fields without a cached or local value are requested
+        pending = [
+            {**entry, **{FIELD_TIMESTAMPS[field]: current_time for field in cached[entry["id"]]}}
+            for entry in entries
+            if any(field not in cached[entry["id"]] for field in self.missing_fields(entry))
+        ]
+        try:
+            enrichments = self.create_batch_enrichment(pending) if len(pending) > 1 else {}
+        except Exception as e:
+            self.logger.warning(f"Batched enrichment failed, processing {len(pending)} entries one by one: {e}")
+            enrichments = {}
+
+        for entry in entries:
+            fresh = enrichments.get(entry["id"], {})
+            self.remember_fields(entry, fresh)
+            generated = {**cached[entry["id"]], **fresh}
+            if generated:
+                self.update_entry(entry["id"], self.generated_update(generated, current_time, entry["id"] in local))
+
+            # Per-article fallback for whatever the batched response lacked
+            remaining = [field for field in self.missing_fields(entry) if field not in generated]
+            if remaining:
+                self.process_entry({
+                    **entry,
+                    **{FIELD_TIMESTAMPS[field]: current_time for field in generated}
+                })
+            else:
+                ITEMS.inc(stage="enrich", result="ok")
+                self.logger.info(f"Successfully processed missing data for entry {entry['id']}")
+
     def update_entry(self, entry_id: str, update_data: Dict[str, Any]) -> None:
         """
-        Update an entry in the database.
+        Queue an update of an entry, written on the next buffer flush.
         
         Args:
             entry_id: ID of the entry to update
             update_data: Dictionary of fields to update
         """
+        self.write_buffer.add_update(entry_id, update_data)
+
+    def process_entry(self, entry: Dict[str, Any]) -> None:
+        """
+        Generate the missing fields of an entry and queue the update.
+        
+        Fields that could not be generated count as a failed attempt, which
+        delays the entry by the work queue backoff.
+        
+        Args:
+            entry: Claimed entry with id, title, description and generation timestamps
+        """
         try:
-            self.supabase.table("rss_feeds")\
-                .update(update_data)\
-                .eq("id", entry_id)\
-                .execute()
+            current_time = datetime.now(pytz.UTC).isoformat()
+
+            if self.mode in ("combined", "batched"):
+                wanted = self.missing_fields(entry)
+            else:
+                wanted = [field for field in self.missing_fields(entry) if field != "summary"]
+            cached = self.cached_fields(entry, wanted)
+            local = self.classify_locally([entry]) if "category" in wanted and "category" not in cached else {}
+            if local:
+                cached["category"] = local[entry["id"]]
+            generated = dict(cached)
+
+            if self.mode in ("combined", "batched"):
+                if requested := [field for field in wanted if field not in cached]:
+                    generated.update(self.create_enrichment(entry["title"], entry["description"], requested))
+            else:
+                # Only generate AI title if it's missing
+                if "ai_title" in wanted and "ai_title" not in cached:
+                    if ai_title := self.create_ai_title(entry["title"], entry["description"]):
+                        generated["ai_title"] = ai_title
+
+                # Only generate category if it's missing
+                if "category" in wanted and "category" not in cached:
+                    if category := self.create_category(entry["title"], entry["description"]):
+                        generated["category"] = category
+            self.remember_fields(entry, {field: value for field, value in generated.items() if field not in cached})
+
+            update_data = self.generated_update(generated, current_time, bool(local))
+
+            if remaining := [field for field in wanted if field not in generated]:
+                update_data.update(self.queue.failure_update(entry, f"could not generate {', '.join(remaining)}"))
+
+            if update_data:
+                self.update_entry(entry["id"], update_data)
+            if generated and not remaining:
+                ITEMS.inc(stage="enrich", result="ok")
+                self.logger.info(f"Successfully processed missing data for entry {entry['id']}")
+            
         except Exception as e:
-            self.logger.error(f"Error updating entry {entry_id}: {e}")
-            raise
+            self.logger.error(f"Failed to process entry {entry['id']}: {e}")
+            self.update_entry(entry["id"], self.queue.failure_update(entry, str(e)))
+
+    def enrich_batch(self, entries: List[Dict[str, Any]], executor: Optional[ThreadPoolExecutor] = None) -> None:
+        """
+        Enrich claimed entries according to the configured mode and queue their updates.
+        
+        Args:
+            entries: Claimed entries with id, title, description and generation timestamps
+            executor: Pool to spread the work over, entries are processed in the calling thread if omitted
+        """
+        if self.mode == "batched":
+            work, items = self.process_group, self.pack_entries(entries)
+        else:
+            work, items = self.process_entry, entries
+        if executor:
+            list(executor.map(work, items))
+        else:
+            for item in items:
+                work(item)
 
     def summarize_entries(self, batch_size: Optional[int] = None) -> None:
         """
         Process a batch of entries with summaries, AI titles, and categories.
         
+        Entries of a batch are processed concurrently by a worker pool whose
+        requests are paced by the shared rate limiter.
+        
         Args:
             batch_size: Optional number of entries to process
         """
         if batch_size is None:
             batch_size = self.config['batch_size']
 
-        while True:
-            entries = self.get_unsummarized_entries(batch_size)
-            
-            if not entries:
-                # Check for entries with missing AI titles or categories
-                self.logger.info("No new entries found. Checking for entries with missing data...")
-                entries = self.get_entries_with_missing_data(batch_size)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                entries = self.get_unsummarized_entries(batch_size)
                 
                 if not entries:
-                    self.logger.info("No entries with missing data found. Processing complete.")
-                    break
-                
-            for entry in entries:
-                try:
-                    # Increased base delay between entries
-                    time.sleep(self.config.get('base_delay', 3))
-                    
-                    current_time = datetime.now(pytz.UTC).isoformat()
-                    update_data = {}
-
-                    # Only generate AI title if it's missing
-                    if entry.get("ai_title_generated_at") is None:
-                        if ai_title := self.create_ai_title(entry["title"], entry["description"]):
-                            update_data.update({
-                                "ai_title": ai_title,
-                                "ai_title_generated_at": current_time
-                            })
-
-                    # Only generate category if it's missing
-                    if entry.get("category_generated_at") is None:
-                        if category := self.create_category(entry["title"], entry["description"]):
-                            update_data.update({
-                                "category": category,
-                                "category_generated_at": current_time
-                            })
-
-                    if update_data:
-                        self.update_entry(entry["id"], update_data)
-                        self.logger.info(f"Successfully processed missing data for entry {entry['id']}")
+                    # Check for entries with missing AI titles or categories
+                    self.logger.info("No new entries found. Checking for entries with missing data...")
+                    entries = self.get_entries_with_missing_data(batch_size)
                     
-                except Exception as e:
-                    self.logger.error(f"Failed to process entry {entry['id']}: {e}")
-                    continue
\ No newline at end of file
+                    if not entries:
+                        self.logger.info("No entries with missing data found. Processing complete.")
+                        self.logger.info(f"Rate limiter stats: {self.limiter.stats()}")
+                        break
+                
+                self.enrich_batch(entries, executor)
+
+                if not self.write_buffer.flush():
+                    self.logger.error("Failed to save processed entries, stopping summarization")
+                    break
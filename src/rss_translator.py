@@ -1,75 +1,235 @@
-from supabase import Client
 import logging
-from deep_translator import GoogleTranslator
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from datetime import datetime
 import pytz
-from langdetect import detect
+import re
+import threading
+from write_buffer import WriteBuffer
+from cache import PersistentCache, fingerprint
+from language_detector import LanguageDetector
+from work_queue import WorkQueue
+from metrics import ITEMS, STAGE_SECONDS
+
+if TYPE_CHECKING:
+    from deep_translator import GoogleTranslator
+    from supabase import Client
+
+# Line used to join several texts into one backend request
+BATCH_SEPARATOR = "\n\n###\n\n"
+BATCH_SPLIT_PATTERN = re.compile(r"\s*#\s*#\s*#\s*")
 
 class RSSTranslator:
-    def __init__(self, supabase: Client, logger: logging.Logger):
+    def __init__(
+        self,
+        supabase: "Client",
+        logger: logging.Logger,
+        config: Optional[dict] = None,
+        write_buffer: Optional[WriteBuffer] = None
+    ):
         self.supabase = supabase
         self.logger = logger
-        self.translator = GoogleTranslator(source='auto', target='en')
+        self.config = (config or {}).get('translation', {})
+        self.write_buffer = write_buffer or WriteBuffer(supabase, logger)
+        self.queue = WorkQueue(supabase, logger, "translate", config)
+        self.target_language = self.config.get('target_language', 'en')
+        self._translator = None
+        self._translator_lock = threading.Lock()
+        self.max_batch_chars = self.config.get('max_batch_chars', 4500)
+        self.detector = LanguageDetector(logger, self.config.get('language_detection', {}))
+        self.detector_loaded = False
+        self.skipped_translations = 0
+        self.cache = None
+        cache_config = self.config.get('cache', {})
+        if cache_config.get('enabled', False):
+            self.cache = PersistentCache(
+                cache_config.get('path', 'cache/translations.sqlite3'),
+                max_entries=cache_config.get('max_entries', 100000),
+                memory_entries=cache_config.get('memory_entries', 5000),
+                name="translation"
+            )
+
+    @property
+    def translator(self) -> "GoogleTranslator":
+        """Translation backend, created on first use so runs without translation work skip loading it"""
+        if self._translator is None:
+            with self._translator_lock:
+                if self._translator is None:
+                    from deep_translator import GoogleTranslator
+                    self._translator = GoogleTranslator(
+                        source=self.config.get('source_language', 'auto'),
+                        target=self.target_language
+                    )
+        return self._translator
 
-    def is_english(self, text: str) -> bool:
+    @translator.setter
+    def translator(self, backend: "GoogleTranslator") -> None:
+        self._translator = backend
+
+    def cache_key(self, text: str) -> str:
+        """Cache key of a text, insensitive to whitespace differences"""
+        return fingerprint(' '.join(text.split()), self.target_language)
+
+    def is_english(self, text: str, source_url: Optional[str] = None) -> bool:
         """Check if text is already in English"""
-        try:
-            if not text or len(text.strip()) < 10:  # Skip very short texts
-                return True
-            return detect(text) == 'en'
-        except Exception as e:
-            self.logger.warning(f"Language detection error: {str(e)}")
-            return False
-
-    def translate_text(self, text: str) -> str:
-        """Translate text to English if not already in English"""
-        try:
+        language = self.detector.detect(text, source_url)
+        return language is None or language == self.target_language
+
+    def translate_texts(self, texts: List[str], source_urls: Optional[List[Optional[str]]] = None) -> List[str]:
+        """Translate many texts with as few backend requests as possible"""
+        source_urls = source_urls or [None] * len(texts)
+        results: List[Optional[str]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        undecided: List[int] = []
+
+        for index, text in enumerate(texts):
             if not text:
-                return ""
-            if self.is_english(text):
-                self.logger.debug("Text already in English, skipping translation")
-                return text
-            return self.translator.translate(text)
-        except Exception as e:
-            self.logger.error(f"Translation error: {str(e)}")
-            return ""
+                results[index] = ""
+            elif self.cache and (cached := self.cache.get(self.cache_key(text))) is not None:
+                results[index] = cached
+            else:
+                undecided.append(index)
+
+        languages = self.detector.detect_batch(
+            [texts[index] for index in undecided],
+            [source_urls[index] for index in undecided]
+        )
+        for index, language in zip(undecided, languages):
+            if language is None or language == self.target_language:
+                results[index] = texts[index]
+                self.skipped_translations += 1
+                ITEMS.inc(stage="translate", result="skipped")
+            else:
+                pending.setdefault(texts[index], []).append(index)
+
+        for chunk in self._pack_texts(list(pending)):
+            for text, translated in zip(chunk, self._translate_chunk(chunk)):
+                if translated and self.cache:
+                    self.cache.set(self.cache_key(text), translated)
+                for index in pending[text]:
+                    results[index] = translated
+
+        return results
+
+    def _pack_texts(self, texts: List[str]) -> List[List[str]]:
+        """Group texts into chunks whose joined payload fits in one request"""
+        chunks: List[List[str]] = []
+        current: List[str] = []
+        size = 0
+        for text in texts:
+            # Texts that could be confused with the separator travel alone
+            if '#' in text or len(text) >= self.max_batch_chars:
+                chunks.append([text])
+                continue
+            if current and size + len(BATCH_SEPARATOR) + len(text) > self.max_batch_chars:
+                chunks.append(current)
+                current, size = [], 0
+            size += len(text) + (len(BATCH_SEPARATOR) if current else 0)
+            current.append(text)
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _translate_chunk(self, chunk: List[str]) -> List[str]:
+        """Translate a packed chunk, falling back to one request per text if it cannot be split back"""
+        if len(chunk) > 1:
+            try:
+                with STAGE_SECONDS.time(stage="translate"):
+                    translated = self.translator.translate(BATCH_SEPARATOR.join(chunk))
+                parts = BATCH_SPLIT_PATTERN.split(translated.strip()) if translated else []
+                if len(parts) == len(chunk) and all(parts):
+                    return [part.strip() for part in parts]
+                self.logger.warning(
+                    f"Batch translation returned {len(parts)} parts for {len(chunk)} texts, translating one by one"
+                )
+            except Exception as e:
+                self.logger.warning(f"Batch translation error, translating one by one: {str(e)}")
+
+        results = []
+        for text in chunk:
+            try:
+                with STAGE_SECONDS.time(stage="translate"):
+                    results.append(self.translator.translate(text) or "")
+            except Exception as e:
+                self.logger.error(f"Translation error: {str(e)}")
+                results.append("")
+        return results
+
+    def load_language_hints(self) -> None:
+        """Seed the per-source language hints once per process"""
+        if not self.detector_loaded:
+            self.detector.load_source_hints(self.supabase)
+            self.detector_loaded = True
+
+    def _untranslated(self, query):
+        return query.is_("translated_at", "null").is_("canonical_id", "null")
 
     def get_untranslated_entries(self, batch_size: int = 10) -> List[dict]:
-        """Get entries that haven't been translated yet"""
-        try:
-            result = self.supabase.table("rss_feeds")\
-                .select("id", "title", "description")\
-                .is_("translated_at", "null")\
-                .limit(batch_size)\
-                .execute()
-            return result.data
-        except Exception as e:
-            self.logger.error(f"Error fetching untranslated entries: {str(e)}")
-            return []
+        """Claim entries that haven't been translated yet"""
+        return self.queue.claim(batch_size, self._untranslated)
+
+    def claim_ids(self, ids: List[Any]) -> List[dict]:
+        """Claim the given entries, skipping those translated already or linked to a canonical entry"""
+        return self.queue.claim_ids(ids, self._untranslated)
+
+    def backlog_size(self, count: str = "planned") -> Optional[int]:
+        """Number of entries waiting for translation, counted with the given PostgREST count method"""
+        return self.queue.backlog(self._untranslated, count=count)
+
+    def has_backlog(self) -> bool:
+        """Check whether any entry is waiting for translation"""
+        return self.queue.has_backlog(self._untranslated)
+
+    def translate_batch(self, entries: List[dict]) -> List[dict]:
+        """Translate claimed entries and queue their updates, returns the translated entries"""
+        # Titles and descriptions of the whole batch share backend requests
+        sources = [entry.get("source_url") for entry in entries]
+        texts = self.translate_texts(
+            [entry["title"] for entry in entries] + [entry["description"] for entry in entries],
+            sources + sources
+        )
+        titles, descriptions = texts[:len(entries)], texts[len(entries):]
+        translated_entries = []
+
+        for entry, title_en, description_en in zip(entries, titles, descriptions):
+            try:
+                # An empty result for a non-empty text means the backend failed
+                if (entry["title"] and not title_en) or (entry["description"] and not description_en):
+                    self.write_buffer.add_update(entry["id"], self.queue.failure_update(entry, "empty translation"))
+                    continue
+
+                translated = {
+                    "title_en": title_en,
+                    "description_en": description_en,
+                    "translated_at": datetime.now(pytz.UTC).isoformat()
+                }
+                
+                self.write_buffer.add_update(entry["id"], translated)
+                translated_entries.append({**entry, **translated})
+                ITEMS.inc(stage="translate", result="ok")
+                self.logger.info(f"Translated entry {entry['id']}")
+            except Exception as e:
+                self.logger.error(f"Error updating translated entry {entry['id']}: {str(e)}")
+        return translated_entries
 
     def translate_entries(self, batch_size: int = 10) -> None:
-        """Translate and update entries"""
+        """Translate and update entries until no claimable entries remain"""
+        self.load_language_hints()
+
         while True:  # Continue until no untranslated entries remain
             entries = self.get_untranslated_entries(batch_size)
             
             if not entries:  # Exit if no more entries to translate
                 self.logger.info("No more entries to translate")
+                self.logger.info(
+                    f"Skipped {self.skipped_translations} translations of English texts, "
+                    f"language detection stats: {dict(self.detector.stats)}"
+                )
+                if self.cache:
+                    self.logger.info(f"Translation cache stats: {self.cache.stats()}")
                 break
             
-            for entry in entries:
-                try:
-                    translated = {
-                        "title_en": self.translate_text(entry["title"]),
-                        "description_en": self.translate_text(entry["description"]),
-                        "translated_at": datetime.now(pytz.UTC).isoformat()
-                    }
-                    
-                    self.supabase.table("rss_feeds")\
-                        .update(translated)\
-                        .eq("id", entry["id"])\
-                        .execute()
-                    
-                    self.logger.info(f"Translated entry {entry['id']}")
-                except Exception as e:
-                    self.logger.error(f"Error updating translated entry {entry['id']}: {str(e)}") 
\ No newline at end of file
+            self.translate_batch(entries)
+
+            if not self.write_buffer.flush():
+                self.logger.error("Failed to save translated entries, stopping translation")
+                break
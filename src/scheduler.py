@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import tempfile
+import time
+
+class FeedScheduler:
+    def __init__(self, logger: logging.Logger, config: Optional[dict] = None):
+        """
+        Per-feed polling schedule adapted to each feed's observed publish rate.
+
+        Busy feeds are polled more often, idle feeds back off gradually and
+        failing feeds back off exponentially. The schedule is saved to a JSON
+        file so a restarted daemon continues where it stopped.
+
+        Args:
+            logger: Logger instance
+            config: Configuration dictionary, the scheduler section is used
+        """
+        self.logger = logger
+        self.config = (config or {}).get('scheduler', {})
+        self.state_file = self.config.get('state_file', 'cache/scheduler_state.json')
+        self.min_interval = self.config.get('min_interval_seconds', 300)
+        self.max_interval = self.config.get('max_interval_seconds', 21600)
+        self.default_interval = self.config.get('default_interval_seconds', 1800)
+        self.idle_factor = self.config.get('idle_backoff_factor', 1.5)
+        self.target_entries_per_poll = self.config.get('target_entries_per_poll', 3)
+        self.rate_smoothing = self.config.get('rate_smoothing', 0.3)
+        self.feeds: Dict[str, dict] = {}
+        # Set when several workers save to the same file, each then only replaces its own feeds
+        self.shared = False
+
+    def _read(self) -> Dict[str, dict]:
+        with open(self.state_file, 'r') as file:
+            return json.load(file)
+
+    def load(self) -> None:
+        """Load the saved schedule, if any"""
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            self.feeds = self._read()
+            self.logger.info(f"Loaded schedule for {len(self.feeds)} feeds")
+        except Exception as e:
+            self.logger.warning(f"Error loading schedule, starting fresh: {str(e)}")
+
+    def save(self) -> None:
+        """
+        Write the schedule atomically to the state file.
+
+        The schedule is keyed by feed URL, so a shared file survives worker
+        restarts and renames. Shared saves hold a lock file, keep the feeds
+        of other workers and drop feeds nobody polled for twice the maximum
+        interval, such as feeds removed from the list.
+        """
+        directory = os.path.dirname(self.state_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        if not self.shared:
+            self._write(self.feeds)
+            return
+
+        import fcntl
+
+        with open(f"{self.state_file}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            feeds: Dict[str, dict] = {}
+            if os.path.exists(self.state_file):
+                try:
+                    cutoff = time.time() - 2 * self.max_interval
+                    feeds = {url: state for url, state in self._read().items() if state["next_due"] >= cutoff}
+                except Exception as e:
+                    self.logger.warning(f"Error reading the shared schedule, keeping only this worker's feeds: {str(e)}")
+            feeds.update(self.feeds)
+            self._write(feeds)
+
+    def _write(self, feeds: Dict[str, dict]) -> None:
+        directory = os.path.dirname(self.state_file)
+        descriptor, temp_file = tempfile.mkstemp(dir=directory or ".", prefix=f"{os.path.basename(self.state_file)}.")
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(feeds, file)
+            os.replace(temp_file, self.state_file)
+        except BaseException:
+            os.unlink(temp_file)
+            raise
+
+    def sync(self, urls: List[str], now: Optional[float] = None) -> None:
+        """Schedule new feeds immediately and forget feeds no longer listed"""
+        now = now or time.time()
+        for url in urls:
+            self.feeds.setdefault(url, {
+                "interval": self.default_interval,
+                "next_due": now,
+                "last_polled": None,
+                "rate": None,
+                "failures": 0
+            })
+        for url in set(self.feeds) - set(urls):
+            del self.feeds[url]
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Feeds whose next poll time has passed, most overdue first"""
+        now = now or time.time()
+        due = [url for url, state in self.feeds.items() if state["next_due"] <= now]
+        return sorted(due, key=lambda url: self.feeds[url]["next_due"])
+
+    def seconds_until_next(self, now: Optional[float] = None) -> float:
+        """Time until the next feed is due"""
+        now = now or time.time()
+        if not self.feeds:
+            return float(self.default_interval)
+        return max(0.0, min(state["next_due"] for state in self.feeds.values()) - now)
+
+    def record(self, url: str, new_entries: Optional[int], now: Optional[float] = None) -> None:
+        """
+        Update the schedule of a feed after a poll.
+
+        Args:
+            url: Feed URL
+            new_entries: Number of new entries found, None if the poll failed
+            now: Poll time, defaults to the current time
+        """
+        now = now or time.time()
+        state = self.feeds.get(url)
+        if state is None:
+            return
+
+        if new_entries is None:
+            state["failures"] += 1
+            interval = min(self.max_interval, self.default_interval * 2 ** state["failures"])
+        else:
+            state["failures"] = 0
+            if state["last_polled"] is not None:
+                # Smoothed entries per second since the previous poll
+                observed = new_entries / max(1.0, now - state["last_polled"])
+                previous = state["rate"]
+                state["rate"] = observed if previous is None else (
+                    self.rate_smoothing * observed + (1 - self.rate_smoothing) * previous
+                )
+            state["last_polled"] = now
+
+            if new_entries == 0 or not state["rate"]:
+                interval = state["interval"] * self.idle_factor if new_entries == 0 else state["interval"]
+            else:
+                interval = self.target_entries_per_poll / state["rate"]
+            interval = min(self.max_interval, max(self.min_interval, interval))
+
+        state["interval"] = interval
+        state["next_due"] = now + interval
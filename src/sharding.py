@@ -0,0 +1,213 @@
+from bisect import bisect
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, List, Optional
+import hashlib
+import logging
+import os
+import socket
+import threading
+import pytz
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+def _position(key: str) -> int:
+    """Position of a key on the ring"""
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    def __init__(self, members: List[str], replicas: int = 64):
+        """
+        Consistent hash ring assigning keys to members.
+
+        Every member is placed at several points of the ring and owns the
+        keys up to each point, so adding or removing a member only moves the
+        keys next to its own points.
+
+        Args:
+            members: Member names
+            replicas: Points per member, more points spread keys more evenly
+        """
+        self.members = sorted(set(members))
+        points = sorted((_position(f"{member}#{replica}"), member) for member in self.members for replica in range(replicas))
+        self._positions = [position for position, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Member owning a key, None if the ring is empty"""
+        if not self._positions:
+            return None
+        return self._owners[bisect(self._positions, _position(key)) % len(self._positions)]
+
+class DatabaseRegistry:
+    def __init__(self, supabase: "Client", table: str = "workers"):
+        """Worker heartbeats stored in a table with worker_id and heartbeat_at columns"""
+        self.supabase = supabase
+        self.table = table
+
+    def heartbeat(self, worker_id: str, now: datetime) -> None:
+        self.supabase.table(self.table)\
+            .upsert({"worker_id": worker_id, "heartbeat_at": now.isoformat()}, on_conflict="worker_id")\
+            .execute()
+
+    def members(self, cutoff: datetime) -> List[str]:
+        result = self.supabase.table(self.table)\
+            .select("worker_id")\
+            .gte("heartbeat_at", cutoff.isoformat())\
+            .execute()
+        return [row["worker_id"] for row in result.data]
+
+    def leave(self, worker_id: str) -> None:
+        self.supabase.table(self.table).delete().eq("worker_id", worker_id).execute()
+
+class RedisRegistry:
+    def __init__(self, url: str, timeout_seconds: float, prefix: str = "workers:"):
+        """Worker heartbeats stored as Redis keys expiring after timeout_seconds"""
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=5, decode_responses=True)
+        self.timeout_seconds = timeout_seconds
+        self.prefix = prefix
+
+    def heartbeat(self, worker_id: str, now: datetime) -> None:
+        self.client.set(self.prefix + worker_id, now.isoformat(), ex=max(1, int(self.timeout_seconds)))
+
+    def members(self, cutoff: datetime) -> List[str]:
+        # Expired heartbeats are removed by Redis itself
+        return [key[len(self.prefix):] for key in self.client.scan_iter(f"{self.prefix}*")]
+
+    def leave(self, worker_id: str) -> None:
+        self.client.delete(self.prefix + worker_id)
+
+class ShardCoordinator:
+    def __init__(
+        self,
+        logger: logging.Logger,
+        registry: Optional[Any] = None,
+        worker_id: Optional[str] = None,
+        members: Optional[List[str]] = None,
+        replicas: int = 64,
+        heartbeat_seconds: float = 30,
+        timeout_seconds: float = 120
+    ):
+        """
+        Split feeds and backlog between workers by consistent hashing.
+
+        Feeds are assigned by hashing source_url, so each feed is fetched by
+        one worker. Translation and enrichment rows stay claimable by every
+        worker, but each worker prefers the rows whose id hashes to it, so
+        concurrent claims rarely collide. With a registry, workers send
+        heartbeats and the ring is rebuilt whenever a worker joins or stops
+        sending them. Without one, the members are fixed.
+
+        Args:
+            logger: Logger instance
+            registry: DatabaseRegistry or RedisRegistry, members are fixed if omitted
+            worker_id: Name of this worker, defaults to WORKER_ID or host and process id
+            members: Initial members, this worker alone if omitted
+            replicas: Ring points per worker
+            heartbeat_seconds: Interval between heartbeats
+            timeout_seconds: Heartbeat age after which a worker counts as gone
+        """
+        self.logger = logger
+        self.registry = registry
+        self.worker_id = worker_id or os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self.replicas = replicas
+        self.heartbeat_seconds = heartbeat_seconds
+        self.timeout_seconds = timeout_seconds
+        self.ring = HashRing(members or [self.worker_id], replicas)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, supabase: "Client", logger: logging.Logger, config: dict) -> "ShardCoordinator":
+        """Create a coordinator with the registry selected by the sharding config section"""
+        sharding = config.get('sharding', {})
+        timeout_seconds = sharding.get('timeout_seconds', 120)
+        if sharding.get('backend', 'database') == 'redis':
+            url = os.environ.get("REDIS_URL") or sharding.get('url')
+            if not url:
+                raise ValueError("REDIS_URL not found in environment variables for sharding")
+            registry = RedisRegistry(url, timeout_seconds)
+        else:
+            registry = DatabaseRegistry(supabase, sharding.get('table', 'workers'))
+        return cls(
+            logger,
+            registry=registry,
+            replicas=sharding.get('replicas', 64),
+            heartbeat_seconds=sharding.get('heartbeat_seconds', 30),
+            timeout_seconds=timeout_seconds
+        )
+
+    @classmethod
+    def static(cls, index: int, count: int, logger: logging.Logger) -> "ShardCoordinator":
+        """Coordinator for shard index of count fixed shards, without heartbeats"""
+        return cls(logger, worker_id=str(index), members=[str(shard) for shard in range(count)])
+
+    @property
+    def members(self) -> List[str]:
+        return self.ring.members
+
+    @property
+    def size(self) -> int:
+        return len(self.ring.members)
+
+    def owns(self, key: str) -> bool:
+        """Check whether a key hashes to this worker"""
+        return self.ring.owner(key) == self.worker_id
+
+    def assigned(self, urls: List[str]) -> List[str]:
+        """Feeds of this worker"""
+        return [url for url in urls if self.owns(url)]
+
+    def prefer(self, ids: List[Any]) -> List[Any]:
+        """Row ids hashing to this worker first, then the others in their original order"""
+        return sorted(ids, key=lambda value: not self.owns(str(value)))
+
+    def heartbeat(self) -> None:
+        """Record this worker as alive and rebuild the ring if the live workers changed"""
+        if not self.registry:
+            return
+        now = datetime.now(pytz.UTC)
+        try:
+            self.registry.heartbeat(self.worker_id, now)
+            members = set(self.registry.members(now - timedelta(seconds=self.timeout_seconds)))
+        except Exception as e:
+            # Keep the last known workers, at worst some feeds are fetched twice
+            self.logger.warning(f"Error sending worker heartbeat: {str(e)}")
+            return
+        members.add(self.worker_id)
+        previous = set(self.ring.members)
+        if members != previous:
+            joined, left = sorted(members - previous), sorted(previous - members)
+            self.ring = HashRing(list(members), self.replicas)
+            self.logger.info(
+                f"Rebalanced over {len(members)} workers"
+                + (f", joined: {', '.join(joined)}" if joined else "")
+                + (f", left: {', '.join(left)}" if left else "")
+            )
+
+    def start(self) -> None:
+        """Join the workers and keep sending heartbeats from a background thread"""
+        if not self.registry or self._thread:
+            return
+        self.heartbeat()
+
+        def beat():
+            while not self._stop.wait(self.heartbeat_seconds):
+                self.heartbeat()
+
+        self._thread = threading.Thread(target=beat, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the heartbeats and leave, so the other workers take over right away"""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.registry.leave(self.worker_id)
+        except Exception as e:
+            self.logger.warning(f"Error leaving the workers: {str(e)}")
@@ -1,10 +1,58 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
+import json
 import os
+import threading
+import time
 from datetime import datetime
 import pytz
+import yaml
+from dateutil import parser
+from metrics import METRICS, SamplingProfiler, merge_snapshots, render_prometheus, summarize
 
 app = Flask(__name__)
 
+# Set by serve() when the endpoints run inside the worker process
+app.config["LIVE_METRICS"] = False
+app.config["METRICS_SNAPSHOT_FILE"] = os.environ.get("METRICS_SNAPSHOT_FILE", "cache/metrics.json")
+# file: the snapshot of a worker on the same disk, database: the snapshots published by all workers
+app.config["METRICS_SOURCE"] = os.environ.get("METRICS_SOURCE", "file")
+app.config["PROFILER_ENABLED"] = os.environ.get("ENABLE_PROFILER", "").lower() in ("1", "true", "yes")
+
+profiler = SamplingProfiler()
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def published_snapshot() -> dict:
+    """Snapshots the workers published to the database, combined with a worker label"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            from storage import create_storage
+            with open('config.yaml', 'r') as file:
+                config = yaml.safe_load(file)
+            _storage = (create_storage(config), config.get('metrics', {}).get('table', 'metrics_snapshots'))
+    client, table = _storage
+    rows = client.table(table).select("worker_id", "written_at", "snapshot").execute().data
+    if not rows:
+        return {"written_at": None, "metrics": METRICS.snapshot()}
+    return {
+        "written_at": max(parser.isoparse(row["written_at"]).timestamp() for row in rows),
+        "metrics": merge_snapshots({row["worker_id"]: json.loads(row["snapshot"]) for row in rows})
+    }
+
+def metrics_snapshot() -> dict:
+    """Live metrics of this process, or the snapshots last written by the workers"""
+    if app.config["LIVE_METRICS"]:
+        return {"written_at": time.time(), "metrics": METRICS.snapshot()}
+    if app.config["METRICS_SOURCE"] == "database":
+        return published_snapshot()
+    try:
+        with open(app.config["METRICS_SNAPSHOT_FILE"], 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {"written_at": None, "metrics": METRICS.snapshot()}
+
 @app.route('/')
 def health_check():
     """Basic health check endpoint"""
@@ -19,6 +67,53 @@ def ping():
     """Simple ping endpoint for uptime monitoring"""
     return "pong", 200
 
+@app.route('/metrics')
+def metrics():
+    """Pipeline metrics in the Prometheus text format"""
+    return Response(render_prometheus(metrics_snapshot()["metrics"]), mimetype="text/plain; version=0.0.4")
+
+@app.route('/stats')
+def stats():
+    """Pipeline metrics as JSON with averages and approximate percentiles"""
+    snapshot = metrics_snapshot()
+    written_at = snapshot.get("written_at")
+    return jsonify({
+        "live": app.config["LIVE_METRICS"],
+        "age_seconds": time.time() - written_at if written_at else None,
+        "stats": summarize(snapshot["metrics"])
+    }), 200
+
+@app.route('/profile', methods=['GET'])
+def profile():
+    """Top sampled stacks of the running profiler"""
+    if not app.config["PROFILER_ENABLED"]:
+        return jsonify({"error": "profiler disabled"}), 404
+    return jsonify({"running": profiler.running, "samples": profiler.total, "top": profiler.top()}), 200
+
+@app.route('/profile/<action>', methods=['POST'])
+def toggle_profile(action):
+    """Start or stop the sampling profiler"""
+    if not app.config["PROFILER_ENABLED"]:
+        return jsonify({"error": "profiler disabled"}), 404
+    if action == "start":
+        profiler.start()
+    elif action == "stop":
+        profiler.stop()
+    else:
+        return jsonify({"error": f"unknown action {action}"}), 400
+    return jsonify({"running": profiler.running, "samples": profiler.total}), 200
+
+def serve(port: int, profiler_enabled: bool = False) -> threading.Thread:
+    """Serve the endpoints with live metrics from a background thread of the current process"""
+    from werkzeug.serving import make_server
+
+    app.config["LIVE_METRICS"] = True
+    app.config["PROFILER_ENABLED"] = app.config["PROFILER_ENABLED"] or profiler_enabled
+    server = make_server('0.0.0.0', port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,256 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+import logging
+import os
+import socket
+import time
+import pytz
+from metrics import ITEMS, STAGE_SECONDS
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+def timestamp(dt: datetime) -> str:
+    """ISO timestamp safe to embed in PostgREST filter expressions"""
+    return dt.astimezone(pytz.UTC).isoformat().replace("+00:00", "Z")
+
+class WorkQueue:
+    def __init__(
+        self,
+        supabase: "Client",
+        logger: logging.Logger,
+        stage: str,
+        config: Optional[dict] = None,
+        worker_id: Optional[str] = None,
+        table: str = "rss_feeds"
+    ):
+        """
+        Lease-based work queue over the rows of a table for one processing stage.
+
+        Each stage owns the columns <stage>_available_at, <stage>_lease_owner,
+        <stage>_attempts and <stage>_dead_at. A row can be claimed when it is
+        not dead-lettered and its available_at is empty or in the past.
+        Claiming pushes available_at forward by the lease, failing pushes it
+        forward by an exponential backoff.
+
+        Args:
+            supabase: Supabase client instance
+            logger: Logger instance
+            stage: Stage name used as column prefix
+            config: Configuration dictionary, the work_queue section is used
+            worker_id: Identifier written to claimed rows, defaults to host and process id
+            table: Table holding the work items
+        """
+        self.supabase = supabase
+        self.logger = logger
+        self.stage = stage
+        self.table = table
+        queue_config = (config or {}).get('work_queue', {})
+        self.lease_seconds = queue_config.get('lease_seconds', 600)
+        self.max_attempts = queue_config.get('max_attempts', 5)
+        self.backoff_base_seconds = queue_config.get('backoff_base_seconds', 300)
+        self.worker_id = worker_id or os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self.available_column = f"{stage}_available_at"
+        self.owner_column = f"{stage}_lease_owner"
+        self.attempts_column = f"{stage}_attempts"
+        self.dead_column = f"{stage}_dead_at"
+        # ShardCoordinator of a sharded run, candidates hashing to this worker are claimed first
+        self.shard = None
+
+    def ready_filter(self, now: str, alternatives: Optional[List[str]] = None) -> str:
+        """
+        PostgREST or-expression selecting rows that are ready to be claimed.
+
+        Args:
+            now: Current timestamp
+            alternatives: Conditions of which at least one must also hold
+
+        Returns:
+            Expression for an or_ filter
+        """
+        ready = [f"{self.available_column}.is.null", f"{self.available_column}.lte.{now}"]
+        if not alternatives:
+            return ",".join(ready)
+        # (a or b) and (c or d) written as a single or of and-terms
+        return ",".join(f"and({alternative},{condition})" for alternative in alternatives for condition in ready)
+
+    def claim(
+        self,
+        batch_size: int,
+        filters: Optional[Callable[[Any], Any]] = None,
+        alternatives: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Claim up to batch_size ready rows for this worker.
+
+        Args:
+            batch_size: Maximum number of rows to claim
+            filters: Function adding stage-specific filters to the candidate query
+            alternatives: PostgREST conditions of which at least one must hold
+
+        Returns:
+            Claimed rows with all columns
+        """
+        now = datetime.now(pytz.UTC)
+        started = time.perf_counter()
+        try:
+            query = self.supabase.table(self.table)\
+                .select("id")\
+                .is_(self.dead_column, "null")
+            if filters:
+                query = filters(query)
+            candidates = query.or_(self.ready_filter(timestamp(now), alternatives))\
+                .limit(batch_size * self.shard.size if self.shard else batch_size)\
+                .execute()
+            if not candidates.data:
+                return []
+            ids = [row["id"] for row in candidates.data]
+            if self.shard:
+                # Concurrent workers see the same candidates but mostly claim disjoint ones
+                ids = self.shard.prefer(ids)[:batch_size]
+
+            # The update re-checks availability row by row, so concurrent
+            # workers can never claim the same row twice
+            result = self.supabase.table(self.table)\
+                .update({
+                    self.owner_column: self.worker_id,
+                    self.available_column: timestamp(now + timedelta(seconds=self.lease_seconds))
+                })\
+                .in_("id", ids)\
+                .or_(self.ready_filter(timestamp(now)))\
+                .execute()
+            return result.data
+        except Exception as e:
+            self.logger.error(f"Error claiming {self.stage} work: {e}")
+            return []
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="db", operation="claim")
+
+    def claim_ids(
+        self,
+        ids: List[Any],
+        filters: Optional[Callable[[Any], Any]] = None,
+        alternatives: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Claim specific rows, skipping those leased by another worker.
+
+        Args:
+            ids: IDs of the rows to claim
+            filters: Function adding stage-specific filters, rows already done by the stage are skipped
+            alternatives: PostgREST conditions of which at least one must hold
+
+        Returns:
+            Claimed rows with all columns
+        """
+        if not ids:
+            return []
+        now = datetime.now(pytz.UTC)
+        started = time.perf_counter()
+        try:
+            query = self.supabase.table(self.table)\
+                .update({
+                    self.owner_column: self.worker_id,
+                    self.available_column: timestamp(now + timedelta(seconds=self.lease_seconds))
+                })\
+                .in_("id", ids)\
+                .is_(self.dead_column, "null")
+            if filters:
+                query = filters(query)
+            result = query.or_(self.ready_filter(timestamp(now), alternatives)).execute()
+            return result.data
+        except Exception as e:
+            self.logger.error(f"Error claiming {self.stage} work: {e}")
+            return []
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="db", operation="claim")
+
+    def backlog(
+        self,
+        filters: Optional[Callable[[Any], Any]] = None,
+        alternatives: Optional[List[str]] = None,
+        count: str = "planned"
+    ) -> Optional[int]:
+        """
+        Count the rows waiting for this stage, leased and backed off ones included.
+
+        Args:
+            filters: Function adding stage-specific filters to the count query
+            alternatives: PostgREST conditions of which at least one must hold
+            count: PostgREST count method, planned reads the planner's estimate
+                instead of scanning every matching row like exact
+
+        Returns:
+            Number of rows, None if the count failed
+        """
+        try:
+            return self._backlog_query(filters, alternatives, count=count).execute().count
+        except Exception as e:
+            self.logger.warning(f"Error counting {self.stage} backlog: {e}")
+            return None
+
+    def has_backlog(
+        self,
+        filters: Optional[Callable[[Any], Any]] = None,
+        alternatives: Optional[List[str]] = None
+    ) -> bool:
+        """
+        Check whether any row is waiting for this stage, without counting them.
+
+        Args:
+            filters: Function adding stage-specific filters to the query
+            alternatives: PostgREST conditions of which at least one must hold
+
+        Returns:
+            False only if the query succeeded and found no row
+        """
+        try:
+            return bool(self._backlog_query(filters, alternatives).execute().data)
+        except Exception as e:
+            self.logger.warning(f"Error checking {self.stage} backlog: {e}")
+            return True
+
+    def _backlog_query(
+        self,
+        filters: Optional[Callable[[Any], Any]],
+        alternatives: Optional[List[str]],
+        count: Optional[str] = None
+    ):
+        query = self.supabase.table(self.table)\
+            .select("id", count=count)\
+            .is_(self.dead_column, "null")
+        if filters:
+            query = filters(query)
+        if alternatives:
+            query = query.or_(",".join(alternatives))
+        return query.limit(1)
+
+    def failure_update(self, entry: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """
+        Fields recording a failed attempt on a claimed row.
+
+        The row becomes available again after an exponential backoff, or is
+        dead-lettered once max_attempts is reached.
+
+        Args:
+            entry: Claimed row
+            reason: Short description of the failure, used for logging
+
+        Returns:
+            Dictionary of fields to update
+        """
+        attempts = (entry.get(self.attempts_column) or 0) + 1
+        now = datetime.now(pytz.UTC)
+        update_data = {
+            self.attempts_column: attempts,
+            self.owner_column: None,
+            self.available_column: timestamp(now + timedelta(seconds=self.backoff_base_seconds * 2 ** (attempts - 1)))
+        }
+        ITEMS.inc(stage=self.stage, result="failed")
+        if attempts >= self.max_attempts:
+            ITEMS.inc(stage=self.stage, result="dead_lettered")
+            update_data[self.dead_column] = timestamp(now)
+            self.logger.warning(f"Entry {entry['id']} dead-lettered for {self.stage} after {attempts} attempts: {reason}")
+        else:
+            self.logger.warning(f"Entry {entry['id']} failed {self.stage} attempt {attempts}: {reason}")
+        return update_data
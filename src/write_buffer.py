@@ -0,0 +1,210 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+from metrics import QUEUE_DEPTH, STAGE_SECONDS
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# SQLSTATE classes of errors that may pass on retry: connection, transaction
+# rollback, insufficient resources, operator intervention and system errors
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57", "58")
+
+def is_transient(error: Exception) -> bool:
+    """
+    Check whether a failed request is worth retrying.
+
+    PostgREST errors carry a code: a SQLSTATE, or PGRSTxxx for errors of
+    PostgREST itself, of which PGRST0xx are connection errors. Errors
+    without a code come from the network or the HTTP client.
+    """
+    code = getattr(error, "code", None)
+    if not isinstance(code, str) or not code:
+        return True
+    if code.startswith("PGRST"):
+        return code.startswith("PGRST0")
+    return code[:2] in TRANSIENT_SQLSTATE_CLASSES
+
+def is_missing_function(error: Exception) -> bool:
+    """Check whether an RPC failed because the function does not exist, such as a migration not applied"""
+    return getattr(error, "code", None) in ("PGRST202", "42883")
+
+class WriteBuffer:
+    def __init__(
+        self,
+        supabase: "Client",
+        logger: logging.Logger,
+        batch_size: int = 50,
+        max_delay_seconds: float = 10.0,
+        retry_attempts: int = 3,
+        retry_delay_seconds: float = 5.0,
+        table: str = "rss_feeds"
+    ):
+        """
+        Buffer inserts and per-row updates of a table and write them in bulk.
+
+        Args:
+            supabase: Supabase client instance
+            logger: Logger instance
+            batch_size: Pending row count that triggers a flush, also the chunk size of each request
+            max_delay_seconds: Maximum age of a pending write before a flush is triggered
+            retry_attempts: Attempts per bulk request before giving up
+            retry_delay_seconds: Delay between attempts
+            table: Table the buffer writes to
+        """
+        self.supabase = supabase
+        self.logger = logger
+        self.batch_size = batch_size
+        self.max_delay_seconds = max_delay_seconds
+        self.retry_attempts = retry_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.table = table
+        self._inserts: Dict[str, List[Dict[str, Any]]] = {}
+        self._updates: Dict[Any, Dict[str, Any]] = {}
+        self._first_pending_at: Optional[float] = None
+        # Cleared when the bulk_update function is missing, updates are then written one by one
+        self.bulk_updates = True
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, supabase: "Client", logger: logging.Logger, config: dict) -> "WriteBuffer":
+        """Create a buffer from the database section of the configuration"""
+        database = config.get('database', {})
+        return cls(
+            supabase,
+            logger,
+            batch_size=database.get('batch_size', 50),
+            max_delay_seconds=database.get('flush_interval_seconds', 10.0),
+            retry_attempts=database.get('retry_attempts', 3),
+            retry_delay_seconds=database.get('retry_delay_seconds', 5.0)
+        )
+
+    def pending(self) -> int:
+        """Number of rows waiting to be written"""
+        with self._lock:
+            return sum(len(rows) for rows in self._inserts.values()) + len(self._updates)
+
+    def add_inserts(self, rows: List[Dict[str, Any]], on_conflict: str = "link,source_url") -> None:
+        """
+        Queue rows to be upserted on the given conflict columns.
+
+        Args:
+            rows: Rows to insert
+            on_conflict: Comma separated conflict columns
+        """
+        if not rows:
+            return
+        with self._lock:
+            self._inserts.setdefault(on_conflict, []).extend(rows)
+            self._mark_pending()
+        self._flush_if_due()
+
+    def add_update(self, entry_id: Any, update_data: Dict[str, Any]) -> None:
+        """
+        Queue an update of a single row, merged with earlier updates of the same row.
+
+        Args:
+            entry_id: ID of the row to update
+            update_data: Dictionary of fields to update
+        """
+        with self._lock:
+            self._updates.setdefault(entry_id, {}).update(update_data)
+            self._mark_pending()
+        self._flush_if_due()
+
+    def _mark_pending(self) -> None:
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+
+    def _flush_if_due(self) -> None:
+        with self._lock:
+            pending = sum(len(rows) for rows in self._inserts.values()) + len(self._updates)
+            age = time.monotonic() - self._first_pending_at if self._first_pending_at else 0
+        if pending >= self.batch_size or age >= self.max_delay_seconds:
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        Write all pending rows.
+
+        Returns:
+            True if every write succeeded, False if some rows could not be written
+        """
+        # The flush lock keeps flushes ordered, so a later update of a row
+        # can never be overwritten by an earlier one
+        with self._flush_lock:
+            with self._lock:
+                inserts, self._inserts = self._inserts, {}
+                updates, self._updates = self._updates, {}
+                self._first_pending_at = None
+            QUEUE_DEPTH.set(sum(len(rows) for rows in inserts.values()) + len(updates), queue="write_buffer")
+
+            ok = True
+            for on_conflict, rows in inserts.items():
+                ok = self._write_inserts(rows, on_conflict) and ok
+            if updates:
+                ok = self._write_updates(updates) and ok
+            return ok
+
+    def _chunks(self, rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        size = max(1, self.batch_size)
+        return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+    def _execute_with_retry(self, request, description: str, operation: str) -> bool:
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                with STAGE_SECONDS.time(stage="db", operation=operation):
+                    request.execute()
+                return True
+            except Exception as e:
+                self.logger.warning(f"Error writing {description} (attempt {attempt}/{self.retry_attempts}): {e}")
+                if is_missing_function(e):
+                    self.bulk_updates = False
+                    self.logger.warning("bulk_update function not found, writing updates row by row")
+                    return False
+                if not is_transient(e):
+                    # The same request would fail again
+                    return False
+                if attempt < self.retry_attempts:
+                    time.sleep(self.retry_delay_seconds)
+        return False
+
+    def _write_inserts(self, rows: List[Dict[str, Any]], on_conflict: str) -> bool:
+        ok = True
+        for chunk in self._chunks(rows):
+            request = self.supabase.table(self.table).upsert(chunk, on_conflict=on_conflict)
+            if self._execute_with_retry(request, f"{len(chunk)} rows to {self.table}", "insert"):
+                self.logger.debug(f"Flushed {len(chunk)} inserts to {self.table}")
+            else:
+                self.logger.error(f"Dropped {len(chunk)} inserts to {self.table}")
+                ok = False
+        return ok
+
+    def _write_updates(self, updates: Dict[Any, Dict[str, Any]]) -> bool:
+        # bulk_update sets the columns of the first row on every row, so
+        # updates are grouped by the set of fields they touch
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for entry_id, data in updates.items():
+            groups.setdefault(tuple(sorted(data)), []).append({"id": entry_id, **data})
+
+        ok = True
+        for rows in groups.values():
+            for chunk in self._chunks(rows):
+                # An UPDATE, unlike an upsert on id, never trips NOT NULL checks
+                # of an insert nor recreates rows deleted in the meantime
+                if self.bulk_updates:
+                    request = self.supabase.rpc("bulk_update", {"target": self.table, "updates": chunk})
+                    if self._execute_with_retry(request, f"{len(chunk)} updates to {self.table}", "update"):
+                        self.logger.debug(f"Flushed {len(chunk)} updates to {self.table}")
+                        continue
+                # Fall back to row by row updates so one bad row does not drop the chunk
+                for row in chunk:
+                    data = {key: value for key, value in row.items() if key != "id"}
+                    try:
+                        self.supabase.table(self.table).update(data).eq("id", row["id"]).execute()
+                    except Exception as e:
+                        self.logger.error(f"Error updating entry {row['id']}: {e}")
+                        ok = False
+        return ok
@@ -0,0 +1,7 @@
+-- Per-feed HTTP validators used for conditional GET requests
+create table if not exists feed_state (
+    source_url text primary key,
+    etag text,
+    last_modified text,
+    updated_at timestamptz not null default now()
+);
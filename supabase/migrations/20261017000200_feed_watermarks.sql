@@ -0,0 +1,13 @@
+-- Cached per-feed watermark so a run can read all of them in one request
+alter table feed_state add column if not exists latest_pub_date timestamptz;
+
+-- One grouped query over rss_feeds, used to seed feeds missing from feed_state
+create or replace function latest_pub_dates()
+returns table (source_url text, latest_pub_date timestamptz)
+language sql stable as $$
+    select source_url, max(pub_date) as latest_pub_date
+    from rss_feeds
+    group by source_url
+$$;
+
+create index if not exists rss_feeds_source_url_pub_date_idx on rss_feeds (source_url, pub_date desc);
@@ -0,0 +1,18 @@
+-- Lease-based work queue columns for the translate and enrich stages
+alter table rss_feeds
+    add column if not exists translate_available_at timestamptz,
+    add column if not exists translate_lease_owner text,
+    add column if not exists translate_attempts integer not null default 0,
+    add column if not exists translate_dead_at timestamptz,
+    add column if not exists enrich_available_at timestamptz,
+    add column if not exists enrich_lease_owner text,
+    add column if not exists enrich_attempts integer not null default 0,
+    add column if not exists enrich_dead_at timestamptz;
+
+create index if not exists rss_feeds_translate_pending_idx
+    on rss_feeds (translate_available_at)
+    where translated_at is null and translate_dead_at is null;
+
+create index if not exists rss_feeds_enrich_pending_idx
+    on rss_feeds (enrich_available_at)
+    where translated_at is not null and enrich_dead_at is null;
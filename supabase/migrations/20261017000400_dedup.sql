@@ -0,0 +1,7 @@
+-- Near-duplicate links: duplicates reuse the results of their canonical entry
+alter table rss_feeds
+    add column if not exists canonical_id bigint references rss_feeds (id) on delete set null,
+    add column if not exists dedup_checked_at timestamptz;
+
+create index if not exists rss_feeds_dedup_pending_idx on rss_feeds (id) where dedup_checked_at is null;
+create index if not exists rss_feeds_canonical_id_idx on rss_feeds (canonical_id) where canonical_id is not null;
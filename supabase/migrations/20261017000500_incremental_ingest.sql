@@ -0,0 +1,5 @@
+-- Per-feed hints for incremental ingestion
+alter table feed_state
+    add column if not exists is_sorted boolean,
+    add column if not exists date_format text,
+    add column if not exists seen_filter text;
@@ -0,0 +1,6 @@
+-- Heartbeats of running daemons, used to split feeds between them
+create table if not exists workers (
+    worker_id text primary key,
+    started_at timestamptz not null default now(),
+    heartbeat_at timestamptz not null default now()
+);
@@ -0,0 +1,11 @@
+-- Origin of a stored category: llm, or local for the category pre-classifier,
+-- which only trains on categories chosen by the LLM
+alter table rss_feeds
+    add column if not exists category_source text;
+
+update rss_feeds set category_source = 'llm'
+    where category is not null and category_source is null;
+
+create index if not exists rss_feeds_category_training_idx
+    on rss_feeds (category_generated_at, id)
+    where category_source = 'llm';
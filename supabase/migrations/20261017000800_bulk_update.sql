@@ -0,0 +1,26 @@
+-- Per-row updates of many rows in one request. An upsert on id would check
+-- NOT NULL columns such as link and title on the proposed insert row first,
+-- and would insert a partial row for an id deleted in the meantime; this only
+-- ever updates existing rows. Every row carries an id and the same columns.
+create or replace function bulk_update(target text, updates jsonb)
+returns integer
+language plpgsql as $$
+declare
+    assignments text;
+    updated integer;
+begin
+    select string_agg(format('%I = r.%I', key, key), ', ')
+        into assignments
+        from jsonb_object_keys(updates -> 0) as key
+        where key <> 'id';
+    if assignments is null then
+        return 0;
+    end if;
+    execute format(
+        'update %I as t set %s from jsonb_populate_recordset(null::%I, $1) as r where t.id = r.id',
+        target, assignments, target
+    ) using updates;
+    get diagnostics updated = row_count;
+    return updated;
+end
+$$;
@@ -0,0 +1,7 @@
+-- Latest metrics snapshot of every worker, read by the web service, which
+-- runs on another host than the workers
+create table if not exists metrics_snapshots (
+    worker_id text primary key,
+    written_at timestamptz not null default now(),
+    snapshot text not null
+);
@@ -0,0 +1,19 @@
+import logging
+import os
+import sys
+import pytest
+
+# Modules live flat in src/, the way main.py imports them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from storage import SQLiteClient
+
+@pytest.fixture
+def db(tmp_path):
+    client = SQLiteClient(str(tmp_path / "rss.sqlite3"))
+    yield client
+    client.close()
+
+@pytest.fixture
+def logger():
+    return logging.getLogger("tests")
@@ -0,0 +1,38 @@
+from bloom import BloomFilter
+
+def test_added_items_are_found():
+    bloom = BloomFilter(bits=8192)
+    links = [f"https://example.com/{index}" for index in range(200)]
+    for link in links:
+        bloom.add(link)
+    assert all(link in bloom for link in links)
+
+def test_false_positive_rate_stays_low_up_to_capacity():
+    bloom = BloomFilter(bits=8192)
+    for index in range(bloom.capacity):
+        bloom.add(f"in-{index}")
+    false_positives = sum(f"out-{index}" in bloom for index in range(10000))
+    assert false_positives / 10000 < 0.005
+
+def test_full_filter_starts_over():
+    bloom = BloomFilter(bits=64)
+    for index in range(bloom.capacity):
+        bloom.add(f"old-{index}")
+    bloom.add("new")
+    assert bloom.count == 1
+    assert "new" in bloom
+
+def test_encode_decode_roundtrip():
+    bloom = BloomFilter(bits=1024)
+    bloom.add("a")
+    restored = BloomFilter.decode(bloom.encode(), bits=1024)
+    assert "a" in restored
+    assert restored.count == 1
+
+def test_decode_falls_back_to_empty_filter():
+    assert BloomFilter.decode(None).count == 0
+    assert BloomFilter.decode("garbage").count == 0
+    # A filter saved with another size is not reused
+    bloom = BloomFilter(bits=1024)
+    bloom.add("a")
+    assert "a" not in BloomFilter.decode(bloom.encode(), bits=2048)
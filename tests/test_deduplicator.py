@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import pytz
+from deduplicator import Deduplicator, simhash
+
+STORY = "Poland signs a contract for new air defence systems with the United States"
+
+def now(**delta):
+    return (datetime.now(pytz.UTC) - timedelta(**delta)).isoformat()
+
+def store(db, title, **columns):
+    return db.table("rss_feeds").insert({
+        "link": f"https://example.com/{title}", "source_url": "https://example.com/rss",
+        "title": title, "description": "", "pub_date": now(hours=1), **columns
+    }).execute().data[0]
+
+def read(db, entry_id):
+    return db.table("rss_feeds").select().eq("id", entry_id).execute().data[0]
+
+def test_simhash_ignores_case_and_accents():
+    assert simhash("Żona gęś śpi dziś") == simhash("ZONA GES SPI DZIS")
+    assert simhash("!!!") is None
+
+def test_link_points_copies_at_the_earliest_entry(db, logger):
+    deduplicator = Deduplicator(db, logger, {})
+    first = store(db, STORY, translated_at=now(), title_en="translated")
+    copy = store(db, STORY + ".")
+    other = store(db, "Storm warnings issued for the whole Baltic coast tonight")
+
+    remaining = deduplicator.link([first, copy, other])
+    assert deduplicator.write_buffer.flush()
+
+    assert [row["id"] for row in remaining] == [first["id"], other["id"]]
+    linked = read(db, copy["id"])
+    assert linked["canonical_id"] == first["id"]
+    assert linked["title_en"] == "translated"
+    assert linked["dedup_checked_at"] is not None
+    assert read(db, other["id"])["canonical_id"] is None
+
+def test_short_titles_are_never_linked(db, logger):
+    deduplicator = Deduplicator(db, logger, {})
+    rows = [store(db, "Breaking news"), store(db, "Breaking news!")]
+    assert deduplicator.link(rows) == rows
+
+def test_load_window_pages_through_all_entries(db, logger):
+    for index in range(25):
+        store(db, f"{STORY} number {index} of the series today")
+    deduplicator = Deduplicator(db, logger, {"dedup": {"max_window_entries": 20}})
+    deduplicator.load_window(page_size=7)
+    assert len(deduplicator.fingerprints) == 20
+    # The newest entries are kept when the window holds more than max_window_entries
+    assert min(deduplicator.fingerprints) == 6
+
+def test_propagate_copies_results_the_canonical_gained(db, logger):
+    deduplicator = Deduplicator(db, logger, {"summarization": {"mode": "separate"}})
+    canonical = store(db, STORY)
+    copy = store(db, STORY + ".", canonical_id=canonical["id"], dedup_checked_at=now())
+    db.table("rss_feeds").update({
+        "translated_at": now(), "title_en": "translated",
+        "ai_title_generated_at": now(), "ai_title": "title",
+        "category_generated_at": now(), "category": "Defence",
+    }).eq("id", canonical["id"]).execute()
+
+    deduplicator.propagate()
+
+    row = read(db, copy["id"])
+    assert (row["title_en"], row["ai_title"], row["category"]) == ("translated", "title", "Defence")
+    assert row["canonical_id"] == canonical["id"]
+
+def test_propagate_unlinks_duplicates_of_dead_canonicals(db, logger):
+    deduplicator = Deduplicator(db, logger, {})
+    canonical = store(db, STORY, translate_dead_at=now())
+    copy = store(db, STORY + ".", canonical_id=canonical["id"], dedup_checked_at=now())
+    deduplicator.propagate()
+    assert read(db, copy["id"])["canonical_id"] is None
+
+def test_propagate_unlinks_duplicates_waiting_longer_than_the_window(db, logger):
+    deduplicator = Deduplicator(db, logger, {"dedup": {"window_hours": 48}})
+    canonical = store(db, STORY, pub_date=now(hours=90), translated_at=now(), title_en="translated")
+    waiting = store(db, STORY + ".", pub_date=now(hours=90), canonical_id=canonical["id"], dedup_checked_at=now(hours=49))
+    recent = store(db, STORY + "!", pub_date=now(hours=90), canonical_id=canonical["id"], dedup_checked_at=now(hours=1))
+
+    deduplicator.propagate()
+
+    unlinked = read(db, waiting["id"])
+    assert unlinked["canonical_id"] is None
+    # Results that were ready are still copied, only the rest is processed again
+    assert unlinked["title_en"] == "translated"
+    assert read(db, recent["id"])["canonical_id"] == canonical["id"]
+    assert read(db, recent["id"])["title_en"] == "translated"
@@ -0,0 +1,38 @@
+import pytest
+from language_detector import LanguageDetector
+
+ASCII_POLISH_TITLES = [
+    "Co to oznacza dla Polski",
+    "Nowy czolg dla armii a to nie koniec",
+    "Rosja to zagrozenie, a NATO nie reaguje",
+]
+
+@pytest.fixture
+def detector(logger):
+    return LanguageDetector(logger)
+
+@pytest.mark.parametrize("title", ASCII_POLISH_TITLES)
+def test_ascii_polish_titles_are_not_guessed_english(detector, title):
+    assert detector.guess(title) is None
+
+@pytest.mark.parametrize("title", ASCII_POLISH_TITLES)
+def test_ascii_polish_titles_fall_back_to_full_detection(detector, title):
+    assert detector.detect(title, "https://example.pl/rss") == "pl"
+    assert detector.stats["full_detection"] == 1
+    assert detector.source_languages["https://example.pl/rss"] == {"pl": 1}
+
+def test_polish_characters_are_polish(detector):
+    assert detector.guess("Zażółć gęślą jaźń") == "pl"
+
+def test_english_title_needs_two_distinct_stopwords(detector):
+    assert detector.guess("The army has a new tank and the budget for it") == "en"
+    assert detector.guess("The Warsaw Summit Communique") is None
+
+def test_source_hint_skips_detection(detector):
+    for _ in range(detector.min_source_samples):
+        detector.learn("https://example.com/rss", "en")
+    assert detector.detect("Co to oznacza dla Polski", "https://example.com/rss") == "en"
+    assert detector.stats["source_hint"] == 1
+
+def test_short_texts_are_not_detected(detector):
+    assert detector.detect("Tak") is None
@@ -0,0 +1,66 @@
+import pytest
+import rate_limiter
+from rate_limiter import TokenBucketLimiter
+
+class Clock:
+    """Stand-in for the time module whose sleep advances the monotonic clock"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+def test_burst_is_sent_without_waiting(clock):
+    limiter = TokenBucketLimiter(2, burst=3)
+    assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+    assert clock.slept == []
+
+def test_empty_bucket_waits_for_the_rate(clock):
+    limiter = TokenBucketLimiter(2)
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter.acquire() == pytest.approx(0.5)
+    assert limiter.stats()["wait_seconds"] == pytest.approx(0.5)
+
+def test_rate_limited_halves_the_rate_and_recovers(clock):
+    limiter = TokenBucketLimiter(10, min_rate_factor=0.2, recovery_factor=0.1)
+    limiter.on_rate_limited()
+    assert limiter.rate == 5
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    assert limiter.rate == 2
+    assert limiter.stats()["rate_limited"] == 3
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.rate == 10
+
+def test_retry_after_pauses_all_requests(clock):
+    limiter = TokenBucketLimiter(10)
+    limiter.on_rate_limited(retry_after=30)
+    assert limiter.acquire() >= 30
+
+def test_token_budget_limits_large_requests(clock):
+    limiter = TokenBucketLimiter(100, tokens_per_minute=600)
+    assert limiter.acquire(500) == 0
+    # 400 more tokens need 300 refilled, at 10 tokens per second
+    assert limiter.acquire(400) == pytest.approx(30)
+    # Requests larger than the budget wait for a full bucket instead of forever
+    assert limiter.acquire(10000) == pytest.approx(60)
+
+def test_adjust_tokens_returns_unused_estimates(clock):
+    limiter = TokenBucketLimiter(100, tokens_per_minute=600)
+    limiter.acquire(600)
+    limiter.adjust_tokens(600, 100)
+    assert limiter.acquire(500) == 0
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import pytz
+from bloom import BloomFilter
+from rss_fetcher import RSSFetcher, parse_feed
+
+URL = "https://example.com/rss"
+NOW = datetime.now(pytz.UTC).replace(microsecond=0)
+
+def rss(*items):
+    """Feed document with (number, age in hours) items, in the given order"""
+    body = "".join(
+        f"<item><title>Entry {number}</title><link>https://example.com/{number}</link>"
+        f"<pubDate>{(NOW - timedelta(hours=hours)).strftime('%a, %d %b %Y %H:%M:%S +0000')}</pubDate></item>"
+        for number, hours in items
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>{body}</channel></rss>'.encode()
+
+class Response:
+    def __init__(self, content: bytes, etag: str):
+        self.content = content
+        self.headers = {"ETag": etag, "Content-Type": "application/rss+xml"}
+        self.url = URL
+
+def parse(document, watermark_hours=3, state=None, max_entries=100):
+    return parse_feed(document, {}, URL, NOW - timedelta(hours=watermark_hours), state or {}, max_entries, 1024)
+
+def links(parsed):
+    return [entry["link"].rsplit("/", 1)[1] for entry in parsed["entries"]]
+
+def test_parse_returns_entries_newer_than_the_watermark():
+    parsed = parse(rss((1, 1), (2, 2), (3, 4), (4, 5)))
+    assert links(parsed) == ["1", "2"]
+    assert parsed["entries"][0]["pub_date"] == (NOW - timedelta(hours=1)).isoformat()
+    assert parsed["is_sorted"] is True
+
+def test_parse_stops_at_the_watermark_on_feeds_known_to_be_sorted():
+    # Entry 4 is out of order, only a full scan finds it
+    document = rss((1, 1), (2, 4), (3, 5), (4, 2))
+    assert links(parse(document, state={"is_sorted": True})) == ["1"]
+
+    parsed = parse(document)
+    assert links(parsed) == ["1", "4"]
+    assert parsed["is_sorted"] is False
+
+def test_partial_scan_keeps_the_known_order():
+    parsed = parse(rss((1, 1), (2, 4), (3, 2)), state={"is_sorted": True})
+    assert parsed["is_sorted"] is True
+    parsed = parse(rss((1, 1), (2, 2)), state={"is_sorted": False}, max_entries=1)
+    assert links(parsed) == ["1"]
+    assert parsed["is_sorted"] is False
+
+def test_parse_skips_seen_links_and_remembers_new_ones():
+    seen = BloomFilter(bits=1024)
+    seen.add("https://example.com/2")
+    parsed = parse(rss((1, 1), (2, 2)), state={"seen_filter": seen.encode()})
+    assert links(parsed) == ["1"]
+
+    remembered = BloomFilter.decode(parsed["seen_filter"], 1024)
+    assert "https://example.com/1" in remembered
+    assert "https://example.com/2" in remembered
+
+def test_parse_caps_the_entries_per_fetch():
+    assert links(parse(rss((1, 1), (2, 2), (3, 2.5)), max_entries=2)) == ["1", "2"]
+
+def make_fetcher(db, logger, documents):
+    fetcher = RSSFetcher(db, logger, {"rss": {"parse_workers": 0}})
+    fetcher.download_feed = lambda url: Response(documents.pop(0), f'"{len(documents)}"')
+    return fetcher
+
+def test_feed_state_moves_only_after_the_entries_are_saved(db, logger):
+    fetcher = make_fetcher(db, logger, [rss((1, 1), (2, 2)), rss((1, 1), (2, 2))])
+    saved = fetcher.write_buffer.flush
+    fetcher.write_buffer.flush = lambda: False
+
+    assert fetcher.fetch_all([URL], default_days=2) == {URL: 2}
+    assert URL not in fetcher.watermarks
+    assert URL not in fetcher.feed_state
+
+    # The next cycle fetches the same entries again and stores them
+    fetcher.write_buffer.flush = saved
+    assert fetcher.fetch_all([URL], default_days=2) == {URL: 2}
+    assert fetcher.watermarks[URL] == NOW - timedelta(hours=1)
+    assert db.table("feed_state").select().execute().data[0]["etag"] == '"0"'
+    assert len(db.table("rss_feeds").select().execute().data) == 2
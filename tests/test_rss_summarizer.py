@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import json
+import pytz
+from rss_summarizer import RSSSummarizer
+
+CATEGORIES = ["Economy", "Polish Military", "Sport"]
+
+class Mistral:
+    """Chat client answering with the given responses in turn and recording the prompts"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+        self.chat = self
+
+    def complete(self, model, messages, **kwargs):
+        self.prompts.append(messages[0]["content"])
+        content = self.responses.pop(0)
+        content = content if isinstance(content, str) else json.dumps(content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=100)
+        )
+
+def ago(**delta):
+    return (datetime.now(pytz.UTC) - timedelta(**delta)).isoformat()
+
+def make_summarizer(db, logger, *responses, **summarization):
+    config = {"summarization": {
+        "mode": "combined", "model": "test", "categories": CATEGORIES, "requests_per_second": 1000,
+        "cache": {"enabled": False}, "classifier": {"enabled": False}, **summarization
+    }}
+    summarizer = RSSSummarizer(db, "key", logger, config)
+    summarizer.mistral = Mistral(*responses)
+    return summarizer
+
+def test_parse_json_response_accepts_code_fences(db, logger):
+    summarizer = make_summarizer(db, logger)
+    assert summarizer.parse_json_response('```json\n{"summary": "x"}\n```') == {"summary": "x"}
+    assert summarizer.parse_json_response("not json") is None
+    assert summarizer.parse_json_response(None) is None
+
+def test_validate_enrichment_keeps_only_valid_requested_fields(db, logger):
+    summarizer = make_summarizer(db, logger)
+    data = {"ai_title": "  Title  ", "category": "Weather", "summary": 42, "extra": "x"}
+    assert summarizer.validate_enrichment(data, ["ai_title", "category", "summary"]) == {"ai_title": "Title"}
+    assert summarizer.validate_enrichment({"ai_title": "x" * 151, "category": "Sport"}, ["ai_title", "category"]) == {
+        "category": "Sport"
+    }
+    assert summarizer.validate_enrichment({"summary": "   "}, ["summary"]) == {}
+
+def test_create_enrichment_asks_again_for_invalid_fields(db, logger):
+    summarizer = make_summarizer(
+        db, logger,
+        {"ai_title": "Title", "category": "Weather", "summary": "Summary"},
+        {"category": "Economy"}
+    )
+    result = summarizer.create_enrichment("Tytuł", "Opis", ["ai_title", "category", "summary"])
+    assert result == {"ai_title": "Title", "category": "Economy", "summary": "Summary"}
+    # The second request only asks for the field that was invalid
+    instructions = summarizer.mistral.prompts[1].split("Article Title")[0]
+    assert '"category"' in instructions
+    assert '"summary"' not in instructions and '"ai_title"' not in instructions
+
+def test_create_enrichment_gives_up_after_the_reask_attempts(db, logger):
+    summarizer = make_summarizer(db, logger, "not json", {"ai_title": ""}, reask_attempts=1)
+    assert summarizer.create_enrichment("Tytuł", "Opis", ["ai_title"]) == {}
+    assert summarizer.mistral.responses == []
+
+def test_only_recent_entries_are_backfilled_with_summaries(db, logger):
+    done = {"translated_at": ago(), "ai_title_generated_at": ago(), "category_generated_at": ago()}
+    db.table("rss_feeds").insert([
+        {"link": "old", "source_url": "s", "pub_date": ago(days=30), **done},
+        {"link": "recent", "source_url": "s", "pub_date": ago(hours=3), **done},
+        {"link": "untitled", "source_url": "s", "pub_date": ago(days=30), "translated_at": ago()},
+    ]).execute()
+
+    claimed = make_summarizer(db, logger, summary_backfill_days=2).get_entries_with_missing_data(10)
+    assert sorted(row["link"] for row in claimed) == ["recent", "untitled"]
+
+    db.table("rss_feeds").update({"enrich_available_at": None}).gte("id", 0).execute()
+    claimed = make_summarizer(db, logger, summary_backfill_days=None).get_entries_with_missing_data(10)
+    assert sorted(row["link"] for row in claimed) == ["old", "recent", "untitled"]
+
+def article(entry_id, **columns):
+    return {"id": entry_id, "title": f"Tytuł {entry_id}", "description": "Opis artykułu", **columns}
+
+def test_batch_enrichment_maps_results_to_their_articles(db, logger):
+    summarizer = make_summarizer(db, logger, {"results": [
+        {"id": "1", "ai_title": "First", "category": "Sport", "summary": "One."},
+        {"id": 2, "ai_title": "Not requested", "category": "Economy"},
+        {"id": 99, "ai_title": "Unknown article"},
+        "not an object",
+    ]})
+    entries = [article(1), article(2, ai_title_generated_at=ago()), article(3)]
+    assert summarizer.create_batch_enrichment(entries) == {
+        1: {"ai_title": "First", "category": "Sport", "summary": "One."},
+        2: {"category": "Economy"},
+    }
+    # Each article lists only its own missing fields
+    assert "Fields: category, summary" in summarizer.mistral.prompts[0]
+
+def test_batch_enrichment_accepts_a_bare_list_and_ignores_invalid_json(db, logger):
+    summarizer = make_summarizer(db, logger, [{"id": 1, "category": "Sport"}], "{broken")
+    assert summarizer.create_batch_enrichment([article(1), article(2)]) == {1: {"category": "Sport"}}
+    assert summarizer.create_batch_enrichment([article(1), article(2)]) == {}
+
+def test_pack_entries_limits_articles_per_request(db, logger):
+    summarizer = make_summarizer(db, logger, batching={"max_articles_per_request": 2})
+    groups = summarizer.pack_entries([article(index) for index in range(5)])
+    assert [len(group) for group in groups] == [2, 2, 1]
+
+def test_process_group_falls_back_per_article(db, logger):
+    rows = db.table("rss_feeds").insert([
+        {"link": str(index), "source_url": "s", "title": f"Tytuł {index}", "description": "Opis", "translated_at": ago()}
+        for index in range(2)
+    ]).execute().data
+    summarizer = make_summarizer(
+        db, logger,
+        {"results": [{"id": rows[0]["id"], "ai_title": "First", "category": "Sport", "summary": "One."}]},
+        {"ai_title": "Second", "category": "Economy", "summary": "Two."},
+        mode="batched"
+    )
+    summarizer.process_group(rows)
+    assert summarizer.write_buffer.flush()
+
+    stored = {row["id"]: row for row in db.table("rss_feeds").select().execute().data}
+    assert [stored[row["id"]]["ai_title"] for row in rows] == ["First", "Second"]
+    assert all(stored[row["id"]]["summarized_at"] for row in rows)
+    assert len(summarizer.mistral.prompts) == 2
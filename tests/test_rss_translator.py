@@ -0,0 +1,55 @@
+import pytest
+from rss_translator import BATCH_SEPARATOR, RSSTranslator
+
+POLISH = [f"Rząd przyjął nową ustawę numer {index}" for index in range(5)]
+
+class Backend:
+    """Translation backend recording its requests, answering with a marker on every line"""
+
+    def __init__(self, drop_separators=False, fail_batches=False):
+        self.requests = []
+        self.drop_separators = drop_separators
+        self.fail_batches = fail_batches
+
+    def translate(self, text):
+        self.requests.append(text)
+        if BATCH_SEPARATOR in text:
+            if self.fail_batches:
+                raise RuntimeError("Request too large")
+            if self.drop_separators:
+                text = text.replace(BATCH_SEPARATOR, " ")
+        return "\n".join(f"[en] {line}" if line.strip() and line.strip() != "###" else line for line in text.split("\n"))
+
+@pytest.fixture
+def translator(logger):
+    translator = RSSTranslator(None, logger, {"translation": {"max_batch_chars": 120}})
+    translator.translator = Backend()
+    return translator
+
+def test_pack_texts_respects_the_request_size(translator):
+    chunks = translator._pack_texts(POLISH)
+    assert [text for chunk in chunks for text in chunk] == POLISH
+    assert all(len(BATCH_SEPARATOR.join(chunk)) <= 120 for chunk in chunks)
+    assert len(chunks) < len(POLISH)
+
+def test_pack_texts_sends_risky_and_long_texts_alone(translator):
+    chunks = translator._pack_texts(["a", "#hashtag", "b", "x" * 200, "c"])
+    assert ["#hashtag"] in chunks
+    assert ["x" * 200] in chunks
+    assert ["a", "b", "c"] in chunks
+
+def test_translate_chunk_splits_the_batch_response(translator):
+    assert translator._translate_chunk(POLISH[:3]) == [f"[en] {text}" for text in POLISH[:3]]
+    assert len(translator.translator.requests) == 1
+
+@pytest.mark.parametrize("backend", [Backend(drop_separators=True), Backend(fail_batches=True)])
+def test_translate_chunk_falls_back_to_one_request_per_text(translator, backend):
+    translator.translator = backend
+    assert translator._translate_chunk(POLISH[:3]) == [f"[en] {text}" for text in POLISH[:3]]
+    assert backend.requests[1:] == POLISH[:3]
+
+def test_translate_texts_skips_english_and_deduplicates(translator):
+    texts = [POLISH[0], "The government has approved a new law on funding for schools", POLISH[0], ""]
+    translated = translator.translate_texts(texts)
+    assert translated == [f"[en] {POLISH[0]}", texts[1], f"[en] {POLISH[0]}", ""]
+    assert translator.translator.requests == [POLISH[0]]
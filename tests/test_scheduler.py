@@ -0,0 +1,66 @@
+import json
+import pytest
+from scheduler import FeedScheduler
+
+URL = "https://example.com/rss"
+
+@pytest.fixture
+def scheduler(logger, tmp_path):
+    scheduler = FeedScheduler(logger, {"scheduler": {
+        "state_file": str(tmp_path / "schedule.json"),
+        "min_interval_seconds": 300,
+        "max_interval_seconds": 21600,
+        "default_interval_seconds": 1800,
+        "idle_backoff_factor": 1.5,
+        "target_entries_per_poll": 3,
+        "rate_smoothing": 1.0,
+    }})
+    scheduler.sync([URL], now=1000)
+    return scheduler
+
+def test_new_feeds_are_due_at_once(scheduler):
+    assert scheduler.due(now=1000) == [URL]
+    assert scheduler.seconds_until_next(now=1000) == 0
+
+def test_first_poll_keeps_the_default_interval(scheduler):
+    scheduler.record(URL, 5, now=1000)
+    assert scheduler.feeds[URL]["next_due"] == 1000 + 1800
+
+def test_busy_feeds_are_polled_for_the_target_entries(scheduler):
+    scheduler.record(URL, 0, now=1000)
+    # 6 entries in 1200 seconds, 3 entries are expected every 600 seconds
+    scheduler.record(URL, 6, now=2200)
+    assert scheduler.feeds[URL]["interval"] == 600
+    # Faster than min_interval is clamped
+    scheduler.record(URL, 60, now=2800)
+    assert scheduler.feeds[URL]["interval"] == 300
+
+def test_idle_feeds_back_off_up_to_the_maximum(scheduler):
+    now = 1000
+    intervals = []
+    for _ in range(12):
+        scheduler.record(URL, 0, now=now)
+        intervals.append(scheduler.feeds[URL]["interval"])
+        now = scheduler.feeds[URL]["next_due"]
+    assert intervals[:2] == [2700, 4050]
+    assert intervals[-1] == 21600
+
+def test_failures_back_off_exponentially_and_reset(scheduler):
+    scheduler.record(URL, None, now=1000)
+    scheduler.record(URL, None, now=2000)
+    assert scheduler.feeds[URL]["failures"] == 2
+    assert scheduler.feeds[URL]["interval"] == 1800 * 4
+    scheduler.record(URL, 1, now=3000)
+    assert scheduler.feeds[URL]["failures"] == 0
+
+def test_unknown_and_removed_feeds_are_ignored(scheduler):
+    scheduler.record("https://other.example.com/rss", 3, now=1000)
+    scheduler.sync([], now=1000)
+    assert scheduler.feeds == {}
+
+def test_schedule_survives_a_restart(scheduler, logger):
+    scheduler.record(URL, 2, now=1000)
+    scheduler.save()
+    restarted = FeedScheduler(logger, {"scheduler": {"state_file": scheduler.state_file}})
+    restarted.load()
+    assert restarted.feeds == json.loads(json.dumps(scheduler.feeds))
@@ -0,0 +1,36 @@
+from collections import Counter
+from sharding import HashRing, ShardCoordinator
+
+KEYS = [f"https://feed{index}.example.com/rss" for index in range(2000)]
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([]).owner("key") is None
+
+def test_owner_is_stable_and_independent_of_member_order():
+    first = HashRing(["a", "b", "c"])
+    second = HashRing(["c", "a", "b"])
+    assert all(first.owner(key) == second.owner(key) for key in KEYS)
+
+def test_keys_spread_over_members():
+    counts = Counter(HashRing(["a", "b", "c", "d"]).owner(key) for key in KEYS)
+    assert set(counts) == {"a", "b", "c", "d"}
+    assert min(counts.values()) > len(KEYS) / 4 * 0.6
+
+def test_adding_a_member_only_moves_keys_to_it():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+    assert all(after.owner(key) == "d" for key in moved)
+    assert len(moved) < len(KEYS) / 2
+
+def test_static_shards_partition_the_feeds(logger):
+    shards = [ShardCoordinator.static(index, 3, logger) for index in range(3)]
+    assigned = [url for shard in shards for url in shard.assigned(KEYS)]
+    assert sorted(assigned) == sorted(KEYS)
+
+def test_prefer_puts_own_ids_first(logger):
+    shard = ShardCoordinator.static(1, 2, logger)
+    ordered = shard.prefer(list(range(50)))
+    own = [value for value in ordered if shard.owns(str(value))]
+    assert ordered[:len(own)] == own
+    assert sorted(ordered) == list(range(50))
@@ -0,0 +1,90 @@
+import pytest
+from storage import _logic, _split, parse_logic
+
+def insert(db, *rows):
+    return db.table("rss_feeds").insert([
+        {"link": f"https://example.com/{index}", "source_url": "https://example.com/rss", **row}
+        for index, row in enumerate(rows)
+    ]).execute().data
+
+def ids(result):
+    return sorted(row["id"] for row in result.data)
+
+def test_split_keeps_nested_expressions_together():
+    assert _split("a.is.null,and(b.lt.1,or(c.eq.x,d.eq.y)),e.gt.2") == [
+        "a.is.null", "and(b.lt.1,or(c.eq.x,d.eq.y))", "e.gt.2"
+    ]
+
+def test_parse_logic_builds_a_tree():
+    assert parse_logic("a.is.null,and(b.lt.1,or(c.not.eq.x,d.in.(1,2)))") == [
+        ("a", "is", "null", False),
+        ("and", [("b", "lt", "1", False), ("or", [("c", "eq", "x", True), ("d", "in", ["1", "2"], False)])]),
+    ]
+
+def test_logic_compiles_nested_and_or():
+    sql, params = _logic("title.is.null,and(category.eq.Politics,or(summary.is.null,summary.neq.x))")
+    assert sql == '("title" IS NULL) OR (("category" = ?) AND (("summary" IS NULL) OR ("summary" != ?)))'
+    assert params == ["Politics", "x"]
+
+def test_logic_handles_not_and_in():
+    sql, params = _logic("category.not.is.null,id.in.(1,2)")
+    assert sql == '(NOT ("category" IS NULL)) OR ("id" IN (?, ?))'
+    assert params == ["1", "2"]
+
+def test_logic_rejects_unknown_operators_and_columns():
+    with pytest.raises(ValueError):
+        _logic("title.like.x")
+    with pytest.raises(ValueError):
+        _logic('"title".is.null')
+
+def test_or_filter_selects_matching_rows(db):
+    insert(db, {"title": "a"}, {"title": "b", "category": "Politics"}, {"title": "c", "category": "Sport"})
+    result = db.table("rss_feeds").select("id").or_("category.is.null,category.eq.Politics").execute()
+    assert ids(result) == [1, 2]
+
+def test_or_filter_combines_with_other_filters(db):
+    insert(db, {"title": "a"}, {"title": "b", "category": "Politics"}, {"title": "c", "category": "Sport"})
+    result = db.table("rss_feeds").select("id")\
+        .neq("title", "a")\
+        .or_("category.is.null,and(category.eq.Politics,title.eq.b)")\
+        .execute()
+    assert ids(result) == [2]
+
+def test_in_filter_compares_integer_ids(db):
+    insert(db, {"title": "a"}, {"title": "b"}, {"title": "c"})
+    assert ids(db.table("rss_feeds").select("id").or_("id.in.(1,3)").execute()) == [1, 3]
+    assert ids(db.table("rss_feeds").select("id").in_("id", [2]).execute()) == [2]
+
+def test_not_modifier_negates_next_filter_only(db):
+    insert(db, {"title": "a"}, {"title": "b", "category": "Politics"})
+    result = db.table("rss_feeds").select("id").not_.is_("category", "null").eq("title", "b").execute()
+    assert ids(result) == [2]
+
+def test_timestamps_compare_across_formats(db):
+    insert(db, {"title": "a", "translated_at": "2026-10-17T10:00:00Z"}, {"title": "b", "translated_at": "2026-10-17T11:00:00+02:00"})
+    # Both are stored as fixed-width UTC strings, so 11:00+02:00 compares as 09:00 UTC
+    result = db.table("rss_feeds").select("id").or_("translated_at.gt.2026-10-17T09:30:00Z").execute()
+    assert ids(result) == [1]
+
+def test_order_puts_nulls_last_ascending(db):
+    insert(db, {"title": "a"}, {"title": "b", "category": "Sport"}, {"title": "c", "category": "Politics"})
+    rows = db.table("rss_feeds").select("id").order("category").execute().data
+    assert [row["id"] for row in rows] == [3, 2, 1]
+
+def test_upsert_updates_on_conflict_and_returns_rows(db):
+    insert(db, {"title": "a"})
+    rows = db.table("rss_feeds").upsert(
+        [{"link": "https://example.com/0", "source_url": "https://example.com/rss", "title": "changed"}],
+        on_conflict="link,source_url"
+    ).execute().data
+    assert [(row["id"], row["title"]) for row in rows] == [(1, "changed")]
+
+def test_bulk_update_only_updates_existing_rows(db):
+    insert(db, {"title": "a"}, {"title": "b"})
+    result = db.rpc("bulk_update", {
+        "target": "rss_feeds",
+        "updates": [{"id": 1, "category": "Sport"}, {"id": 99, "category": "Sport"}]
+    }).execute()
+    assert result.data == 1
+    rows = db.table("rss_feeds").select("id", "category").order("id").execute().data
+    assert rows == [{"id": 1, "category": "Sport"}, {"id": 2, "category": None}]
@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytz
+from storage import SQLiteClient
+from sharding import ShardCoordinator
+from work_queue import WorkQueue, timestamp
+
+def insert(db, count, **columns):
+    return db.table("rss_feeds").insert([
+        {"link": f"https://example.com/{index}", "source_url": "https://example.com/rss", "title": str(index), **columns}
+        for index in range(count)
+    ]).execute().data
+
+def untranslated(query):
+    return query.is_("translated_at", "null")
+
+def test_ready_filter_without_alternatives():
+    queue = WorkQueue(None, None, "translate")
+    assert queue.ready_filter("NOW") == "translate_available_at.is.null,translate_available_at.lte.NOW"
+
+def test_ready_filter_distributes_alternatives():
+    queue = WorkQueue(None, None, "enrich")
+    assert queue.ready_filter("NOW", ["a.is.null", "b.is.null"]).split(",and(") == [
+        "and(a.is.null,enrich_available_at.is.null)",
+        "a.is.null,enrich_available_at.lte.NOW)",
+        "b.is.null,enrich_available_at.is.null)",
+        "b.is.null,enrich_available_at.lte.NOW)",
+    ]
+
+def test_claim_leases_rows_to_the_worker(db, logger):
+    insert(db, 3)
+    queue = WorkQueue(db, logger, "translate", worker_id="w1")
+    claimed = queue.claim(2, untranslated)
+    assert len(claimed) == 2
+    assert all(row["translate_lease_owner"] == "w1" for row in claimed)
+    # Leased rows are not claimed again until the lease expires
+    remaining = queue.claim(5, untranslated)
+    assert len(remaining) == 1
+    assert remaining[0]["id"] not in {row["id"] for row in claimed}
+    assert queue.claim(5, untranslated) == []
+
+def test_claim_takes_expired_leases_and_skips_dead_and_done_rows(db, logger):
+    past = timestamp(datetime.now(pytz.UTC) - timedelta(minutes=1))
+    future = timestamp(datetime.now(pytz.UTC) + timedelta(minutes=10))
+    insert(db, 1, translate_available_at=past, translate_lease_owner="gone")
+    db.table("rss_feeds").insert([
+        {"link": "leased", "source_url": "s", "translate_available_at": future},
+        {"link": "dead", "source_url": "s", "translate_dead_at": past},
+        {"link": "done", "source_url": "s", "translated_at": past},
+    ]).execute()
+    claimed = WorkQueue(db, logger, "translate", worker_id="w1").claim(10, untranslated)
+    assert [row["id"] for row in claimed] == [1]
+
+def test_claim_with_alternatives_requires_one_to_hold(db, logger):
+    db.table("rss_feeds").insert([
+        {"link": "missing", "source_url": "s"},
+        {"link": "complete", "source_url": "s", "summary": "x", "category": "Sport"},
+    ]).execute()
+    queue = WorkQueue(db, logger, "enrich", worker_id="w1")
+    claimed = queue.claim(10, alternatives=["summary.is.null", "category.is.null"])
+    assert [row["link"] for row in claimed] == ["missing"]
+
+class RacingClient:
+    """Client letting another worker claim rows between the candidate select and the claiming update"""
+
+    def __init__(self, db, race):
+        self.db = db
+        self.race = race
+
+    def table(self, name):
+        query = self.db.table(name)
+        update = query.update
+
+        def racing_update(data):
+            self.race()
+            return update(data)
+
+        query.update = racing_update
+        return query
+
+def test_claim_skips_rows_claimed_after_the_candidate_select(db, logger):
+    insert(db, 3)
+    other = WorkQueue(db, logger, "translate", worker_id="other")
+    queue = WorkQueue(RacingClient(db, lambda: other.claim(2, untranslated)), logger, "translate", worker_id="w1")
+    claimed = queue.claim(3, untranslated)
+    assert [row["id"] for row in claimed] == [3]
+
+def test_concurrent_workers_never_claim_the_same_row(tmp_path, logger):
+    path = str(tmp_path / "rss.sqlite3")
+    insert(SQLiteClient(path), 60)
+    queues = [WorkQueue(SQLiteClient(path), logger, "translate", worker_id=f"w{index}") for index in range(4)]
+
+    def drain(queue):
+        claimed = []
+        while rows := queue.claim(5, untranslated):
+            claimed.extend(row["id"] for row in rows)
+        return claimed
+
+    with ThreadPoolExecutor(max_workers=len(queues)) as executor:
+        claimed = [row_id for rows in executor.map(drain, queues) for row_id in rows]
+    assert sorted(claimed) == list(range(1, 61))
+
+def test_claim_ids_applies_stage_filters(db, logger):
+    insert(db, 2)
+    db.table("rss_feeds").update({"translated_at": timestamp(datetime.now(pytz.UTC))}).eq("id", 1).execute()
+    queue = WorkQueue(db, logger, "translate", worker_id="w1")
+    assert [row["id"] for row in queue.claim_ids([1, 2], untranslated)] == [2]
+    assert queue.claim_ids([2], untranslated) == []
+
+def test_sharded_claim_prefers_own_rows(db, logger):
+    insert(db, 40)
+    shard = ShardCoordinator.static(0, 2, logger)
+    queue = WorkQueue(db, logger, "translate", worker_id="w0")
+    queue.shard = shard
+    claimed = queue.claim(5, untranslated)
+    # Twice the batch is read per worker, the ids hashing to this one are taken first
+    candidates = list(range(1, 11))
+    assert sorted(row["id"] for row in claimed) == sorted(shard.prefer(candidates)[:5])
+    assert any(shard.owns(str(row["id"])) for row in claimed)
+
+def test_failure_update_backs_off_then_dead_letters(logger):
+    queue = WorkQueue(None, logger, "translate", config={"work_queue": {"max_attempts": 2}})
+    first = queue.failure_update({"id": 1}, "error")
+    assert first["translate_attempts"] == 1 and "translate_dead_at" not in first
+    second = queue.failure_update({"id": 1, "translate_attempts": 1}, "error")
+    assert second["translate_attempts"] == 2 and second["translate_dead_at"]
+
+def test_backlog_counts_waiting_rows(db, logger):
+    insert(db, 3)
+    queue = WorkQueue(db, logger, "translate", worker_id="w1")
+    queue.claim(1, untranslated)
+    assert queue.backlog(untranslated) == 3
+    assert queue.backlog(untranslated, count="exact") == 3
@@ -0,0 +1,118 @@
+from collections import Counter
+from write_buffer import WriteBuffer, is_transient
+
+class PostgrestError(Exception):
+    def __init__(self, code):
+        super().__init__(f"error {code}")
+        self.code = code
+
+class Rpc:
+    def __init__(self, client, request):
+        self.client = client
+        self.request = request
+
+    def execute(self):
+        self.client.calls["bulk_update"] += 1
+        if self.client.rpc_errors:
+            raise self.client.rpc_errors.pop(0)
+        return self.request.execute()
+
+class Client:
+    """SQLite client counting requests, whose bulk_update calls fail with the queued errors first"""
+
+    def __init__(self, db, *rpc_errors):
+        self.db = db
+        self.rpc_errors = list(rpc_errors)
+        self.calls = Counter()
+        self.rpc_payloads = []
+
+    def table(self, name):
+        self.calls["table"] += 1
+        return self.db.table(name)
+
+    def rpc(self, name, params=None):
+        self.rpc_payloads.append(params)
+        return Rpc(self, self.db.rpc(name, params))
+
+def rows(db):
+    return {row["id"]: row for row in db.table("rss_feeds").select().execute().data}
+
+def make_buffer(client, logger, **options):
+    return WriteBuffer(client, logger, retry_delay_seconds=0, **{"batch_size": 50, **options})
+
+def store(db, count):
+    db.table("rss_feeds").insert([{"link": str(index), "source_url": "s"} for index in range(count)]).execute()
+
+def test_is_transient():
+    assert is_transient(RuntimeError("connection reset"))
+    assert is_transient(PostgrestError("08006"))
+    assert is_transient(PostgrestError("PGRST000"))
+    assert not is_transient(PostgrestError("23502"))
+    assert not is_transient(PostgrestError("PGRST202"))
+
+def test_inserts_are_chunked_and_flushed_when_the_batch_is_full(db, logger):
+    client = Client(db)
+    buffer = make_buffer(client, logger, batch_size=3)
+    buffer.add_inserts([{"link": str(index), "source_url": "s"} for index in range(2)])
+    assert client.calls["table"] == 0
+    buffer.add_inserts([{"link": str(index), "source_url": "s"} for index in range(2, 7)])
+    assert buffer.pending() == 0
+    assert client.calls["table"] == 3
+    assert len(rows(db)) == 7
+
+def test_updates_of_a_row_are_merged_and_grouped_by_fields(db, logger):
+    store(db, 3)
+    client = Client(db)
+    buffer = make_buffer(client, logger)
+    buffer.add_update(1, {"title": "a"})
+    buffer.add_update(1, {"category": "Sport"})
+    buffer.add_update(2, {"category": "Economy", "title": "b"})
+    buffer.add_update(3, {"title": "c"})
+    assert buffer.flush()
+
+    assert client.calls["bulk_update"] == 2
+    assert sorted(len(payload["updates"]) for payload in client.rpc_payloads) == [1, 2]
+    stored = rows(db)
+    assert (stored[1]["title"], stored[1]["category"]) == ("a", "Sport")
+    assert (stored[2]["title"], stored[2]["category"]) == ("b", "Economy")
+    assert (stored[3]["title"], stored[3]["category"]) == ("c", None)
+
+def test_updates_never_recreate_deleted_rows(db, logger):
+    buffer = make_buffer(Client(db), logger)
+    buffer.add_update(42, {"title": "gone"})
+    assert buffer.flush()
+    assert rows(db) == {}
+
+def test_client_errors_fall_back_to_row_updates_without_retrying(db, logger):
+    store(db, 2)
+    client = Client(db, PostgrestError("23502"))
+    buffer = make_buffer(client, logger, retry_attempts=3)
+    buffer.add_update(1, {"title": "a"})
+    buffer.add_update(2, {"title": "b"})
+    assert buffer.flush()
+    assert client.calls["bulk_update"] == 1
+    assert client.calls["table"] == 2
+    assert buffer.bulk_updates
+    assert [row["title"] for row in rows(db).values()] == ["a", "b"]
+
+def test_transient_errors_are_retried(db, logger):
+    store(db, 1)
+    client = Client(db, PostgrestError("08006"))
+    buffer = make_buffer(client, logger, retry_attempts=3)
+    buffer.add_update(1, {"title": "a"})
+    assert buffer.flush()
+    assert client.calls["bulk_update"] == 2
+    assert client.calls["table"] == 0
+
+def test_missing_bulk_update_function_switches_to_row_updates(db, logger):
+    store(db, 1)
+    client = Client(db, PostgrestError("PGRST202"))
+    buffer = make_buffer(client, logger)
+    buffer.add_update(1, {"title": "a"})
+    assert buffer.flush()
+    assert not buffer.bulk_updates
+
+    buffer.add_update(1, {"title": "b"})
+    assert buffer.flush()
+    assert client.calls["bulk_update"] == 1
+    assert rows(db)[1]["title"] == "b"